@@ -1,3 +1,12 @@
 from django.contrib import admin
+from .models import EmailOutbox
 
-# Register your models here.
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+
+    list_display = ('id', 'to_email', 'subject', 'attempts', 'next_attempt_at', 'sent_at', 'last_error')
+
+    search_fields = ('to_email',)
+
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
@@ -0,0 +1,79 @@
+import json
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from .hashing import HashingUnavailable, acheck_user_password, amake_password
+from .models import User
+from .serializers import LoginSerializer, RegisterSerializer
+from .tokens import obtain_token
+from .views import login_response, register_response
+
+
+def _request_data(request):
+
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return {**request.POST.dict(), **request.FILES.dict()}
+
+
+def _unavailable(exc):
+
+    return JsonResponse({"detail": str(exc)}, status=503)
+
+
+@csrf_exempt
+@require_POST
+async def login_async(request):
+    """
+    Same contract as LoginView, but the password check is awaited on the
+    hashing pool, so the event loop (and the ASGI sync thread) keeps serving
+    other requests meanwhile. Serve through ASGI to benefit.
+    """
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"detail": "Invalid JSON."}, status=400)
+
+    email, password = data.get('email'), data.get('password')
+    user = await User.objects.filter(email=email).afirst() if email and password else None
+    try:
+        if user is None:
+            # Hash once anyway so unknown emails take as long as wrong passwords.
+            if password:
+                await amake_password(password)
+        elif not (await acheck_user_password(user, password) and user.is_active):
+            user = None
+    except HashingUnavailable as e:
+        return _unavailable(e)
+
+    serializer = LoginSerializer(data=data, context={'user': user})
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+    token = await sync_to_async(obtain_token)(user)
+    return JsonResponse(login_response(user, token), status=200)
+
+
+@csrf_exempt
+@require_POST
+async def register_async(request):
+    """
+    Same contract as RegisterView; the new password is hashed on the pool
+    before the user is written.
+    """
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"detail": "Invalid JSON."}, status=400)
+
+    serializer = RegisterSerializer(data=data, context={'request': request})
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+    try:
+        password_hash = await amake_password(serializer.validated_data['password'])
+    except HashingUnavailable as e:
+        return _unavailable(e)
+
+    result = await sync_to_async(serializer.save)(password_hash=password_hash)
+    return JsonResponse(await sync_to_async(register_response)(result), status=201)
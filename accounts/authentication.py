@@ -0,0 +1,183 @@
+import copy, hashlib, threading, time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from .models import User
+from .tokens import is_expired, last_used_at, needs_touch, touch
+
+AUTH_TOKEN_CACHE_KEY = 'accounts:token:{}'
+
+
+def _shared_key(key):
+    # Never put raw API tokens into cache key names.
+    return AUTH_TOKEN_CACHE_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+class TokenCache:
+    """
+    token key -> (user, last use), in two layers: a small per-process LRU with a short
+    TTL in front of the shared Django cache with a longer one. Writes to the
+    user or deletion of the token drop both layers here; other processes'
+    LRUs catch up within AUTH_TOKEN_LOCAL_TTL.
+
+    The shared layer only holds the user's pk and the last use (never the
+    password hash); a hit there loads the user by primary key. Every lookup
+    gets its own copy of the user, so requests never share a mutable instance.
+
+    A LocMemCache is private to each process, so invalidations could never
+    reach the other workers through it; with that backend the shared layer
+    is skipped and every process re-reads the DB once its local entry expires.
+    """
+
+    def __init__(self):
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def local_ttl(self):
+        return getattr(settings, 'AUTH_TOKEN_LOCAL_TTL', 5)
+
+    @property
+    def local_size(self):
+        return getattr(settings, 'AUTH_TOKEN_LOCAL_SIZE', 10000)
+
+    @property
+    def shared(self):
+        return not isinstance(caches['default'], LocMemCache)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._local[key] = ((copy.copy(entry[0]), entry[1]), time.monotonic() + self.local_ttl)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def get(self, key):
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._local.move_to_end(key)
+                    self.local_hits += 1
+                    user, last_used = entry[0]
+                    return copy.copy(user), last_used
+                del self._local[key]
+
+        shared = cache.get(_shared_key(key)) if self.shared else None
+        user = User.objects.filter(pk=shared[0]).first() if shared is not None else None
+        if user is None:
+            self.misses += 1
+            return None
+        self.shared_hits += 1
+        self._remember(key, (user, shared[1]))
+        return user, shared[1]
+
+    def set(self, key, user, last_used):
+
+        if self.shared:
+            cache.set(_shared_key(key), (user.pk, last_used), getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300))
+        self._remember(key, (user, last_used))
+
+    def invalidate(self, *keys):
+
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        if self.shared:
+            cache.delete_many([_shared_key(key) for key in keys])
+        self.invalidations += len(keys)
+
+    def invalidate_user(self, user_id):
+
+        keys = list(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+        if keys:
+            self.invalidate(*keys)
+
+    def stats(self):
+
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "local_size": len(self._local),
+            "shared": self.shared,
+            "hit_ratio": round((self.local_hits + self.shared_hits) / lookups, 4) if lookups else None,
+        }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that serves the token -> user lookup from
+    ``token_cache`` and only falls back to the Token/User join on a miss.
+    Tokens expire AUTH_TOKEN_TTL after their last use (accounts.tokens).
+    """
+
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        # A cached entry that looks expired may predate a touch elsewhere; ask the DB.
+        if entry is None or is_expired(entry[1]):
+            try:
+                token = Token.objects.select_related('user', 'activity').get(key=key)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed('Invalid token.')
+            entry = (token.user, last_used_at(token))
+            if is_expired(entry[1]):
+                token_cache.invalidate(key)
+                raise AuthenticationFailed('Token has expired.')
+            token_cache.set(key, *entry)
+
+        user, last_used = entry
+        if not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        if needs_touch(last_used):
+            token_cache.set(key, user, touch(key))
+        return user, Token(key=key, user=user)
+
+
+def request_user(request, query_param=None):
+    """
+    The user authenticated by a plain (non-DRF) view's ``Authorization:
+    Token <key>`` header, or None. ``query_param`` also accepts the key from
+    the query string, for clients such as EventSource that cannot send headers.
+    """
+    header = request.headers.get('Authorization', '')
+    key = header[len('Token '):].strip() if header.startswith('Token ') else None
+    if not key and query_param:
+        key = request.GET.get(query_param)
+    if not key:
+        return None
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    except AuthenticationFailed:
+        return None
+    return user
+
+
+@receiver(post_save, sender=User)
+def drop_tokens_on_user_save(sender, instance, created, **kwargs):
+
+    # Covers activation/deactivation, profile and password changes.
+    if not created:
+        token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def drop_token_on_delete(sender, instance, **kwargs):
+
+    token_cache.invalidate(instance.key)
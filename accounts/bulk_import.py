@@ -0,0 +1,187 @@
+import csv, io, json, threading
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from .hashing import PasswordHasherPool, make_passwords
+from .models import User
+from .outbox import activation_link, enqueue_emails, verification_email
+from .serializers import BulkUserSerializer
+from .tokens import bulk_create_tokens
+
+IMPORT_TYPES = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 1000
+MAX_IMPORT_BATCH_SIZE = 10000
+
+_import_pool = None
+_import_pool_lock = threading.Lock()
+
+
+def import_hasher_pool():
+    """
+    Hashing pool for imports started over HTTP. It is separate from the
+    login pool and admits at most USER_IMPORT_HASH_WORKERS chunks at a time,
+    so an import never takes the slots interactive logins queue for.
+    """
+    global _import_pool
+    if _import_pool is None:
+        with _import_pool_lock:
+            if _import_pool is None:
+                workers = getattr(settings, 'USER_IMPORT_HASH_WORKERS', 1)
+                _import_pool = PasswordHasherPool(workers=workers, max_concurrency=max(workers, 1))
+    return _import_pool
+
+
+class _RawReader(io.RawIOBase):
+    """Adapts anything with ``read(n)`` (e.g. an HttpRequest) to a raw binary stream."""
+
+    def __init__(self, source):
+        self.source = source
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.source.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def read_rows(stream, import_type):
+    """
+    Yields ``(line_number, row)`` from a binary CSV (with a header row) or
+    NDJSON stream without loading it into memory.
+    """
+    if not hasattr(stream, 'readable'):
+        stream = io.BufferedReader(_RawReader(stream))
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if import_type == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            yield number, {key: value for key, value in row.items() if key and value not in (None, '')}
+        return
+
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else {"__invalid__": True}
+
+
+def guess_import_type(filename=None, content_type=None):
+
+    if (filename or '').endswith(('.ndjson', '.jsonl')) or (content_type or '').startswith(('application/x-ndjson', 'application/jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+class UserImporter:
+    """
+    Creates users from validated rows in batches: one existence query per
+    batch for emails, passwords hashed in parallel on the hashing pool,
+    then users, tokens and activation emails written with bulk_create in
+    one transaction per batch.
+    """
+
+    def __init__(self, batch_size=1000, activate=False, send_activation=True, domain='127.0.0.1:8000', hasher_pool=None):
+        self.batch_size = batch_size
+        self.activate = activate
+        self.send_activation = send_activation and not activate
+        self.domain = domain
+        self.hasher_pool = hasher_pool
+        self.seen = set()
+        self.report = {"rows": 0, "created": 0, "failed": 0, "batches": 0, "errors": []}
+
+    def error(self, line, errors):
+
+        self.report['failed'] += 1
+        if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+            self.report['errors'].append({"line": line, "errors": errors})
+
+    def run(self, rows, progress=None):
+
+        batch = []
+        for line, row in rows:
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+                if progress:
+                    progress(self.report)
+        if batch:
+            self.import_batch(batch)
+            if progress:
+                progress(self.report)
+        return self.report
+
+    def validate(self, batch):
+
+        valid = []
+        for line, row in batch:
+            self.report['rows'] += 1
+            if row.get('__invalid__'):
+                self.error(line, {"non_field_errors": ["Invalid JSON object."]})
+                continue
+            serializer = BulkUserSerializer(data=row)
+            if not serializer.is_valid():
+                self.error(line, serializer.errors)
+                continue
+            data = serializer.validated_data
+            data['email'] = User.objects.normalize_email(data['email'])
+            key = data['email'].lower()
+            if key in self.seen:
+                self.error(line, {"email": ["Duplicate email in this import."]})
+                continue
+            self.seen.add(key)
+            valid.append((line, data))
+
+        existing = set(
+            email.lower() for email in
+            User.objects.filter(email__in=[data['email'] for _, data in valid]).values_list('email', flat=True)
+        )
+        rows = []
+        for line, data in valid:
+            if data['email'].lower() in existing:
+                self.error(line, {"email": ["user with this email already exists."]})
+            else:
+                rows.append((line, data))
+        return rows
+
+    def import_batch(self, batch):
+
+        self.report['batches'] += 1
+        rows = self.validate(batch)
+        if not rows:
+            return
+
+        raw = [(index, data['password']) for index, (_, data) in enumerate(rows) if data.get('password')]
+        hashed = dict(zip((index for index, _ in raw), make_passwords([password for _, password in raw], pool=self.hasher_pool)))
+
+        users = []
+        for index, (_, data) in enumerate(rows):
+            users.append(User(
+                email=data['email'],
+                username=data.get('username', ''),
+                full_name=data.get('full_name', ''),
+                phone=data.get('phone', ''),
+                address=data.get('address', ''),
+                user_type=data.get('user_type', 'USER'),
+                # Without a password the account can only be used once one is set.
+                password=hashed.get(index) or data.get('password_hash') or make_password(None),
+                is_active=self.activate,
+            ))
+
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create(users)
+                bulk_create_tokens(users)
+                if self.send_activation:
+                    enqueue_emails([verification_email(user, activation_link(user, self.domain)) for user in users])
+        except IntegrityError as e:
+            # A concurrent signup took one of the emails; report the whole batch.
+            for line, _ in rows:
+                self.error(line, {"non_field_errors": [f"Batch rejected: {e}"]})
+            return
+
+        self.report['created'] += len(users)
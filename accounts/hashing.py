@@ -0,0 +1,215 @@
+"""
+Password hashing off the request workers.
+
+PBKDF2 runs on a bounded process pool instead of the thread serving the
+request. At most PASSWORD_HASH_MAX_CONCURRENCY jobs are admitted at once;
+callers that cannot get a slot within PASSWORD_HASH_QUEUE_TIMEOUT seconds
+get HashingUnavailable (the views answer 503) instead of piling up, so a
+login burst cannot take every web worker with it.
+
+Only the login / register views and bulk imports hash through here; the
+User model keeps Django's own set_password / check_password, so the admin,
+createsuperuser and migrations never depend on the pool.
+
+This module is imported by the pool's worker processes, so it must not
+import models.
+"""
+import asyncio, multiprocessing, threading, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class HashingUnavailable(Exception):
+
+    def __init__(self, message="Too many sign-ins in progress, please retry shortly."):
+        super().__init__(message)
+
+
+# Runs in the worker processes.
+
+def _make_password(raw_password):
+    return time.time(), hashers.make_password(raw_password)
+
+
+def _check_password(raw_password, encoded):
+    # The setter is only called when the hash should be upgraded; the caller saves it.
+    outdated = []
+    is_correct = hashers.check_password(raw_password, encoded, setter=outdated.append)
+    return time.time(), (is_correct, bool(outdated))
+
+
+def _make_passwords(raw_passwords):
+    return time.time(), [hashers.make_password(raw_password) for raw_password in raw_passwords]
+
+
+class PasswordHasherPool:
+
+    def __init__(self, workers=None, max_concurrency=None):
+        # None: read PASSWORD_HASH_WORKERS / PASSWORD_HASH_MAX_CONCURRENCY from settings.
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.jobs = 0
+        self.rejected = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self._recent = deque(maxlen=1000)
+
+    def _workers(self):
+        return self.workers if self.workers is not None else getattr(settings, 'PASSWORD_HASH_WORKERS', 2)
+
+    @property
+    def enabled(self):
+        return self._workers() > 0
+
+    def _setup(self):
+
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    workers = self._workers()
+                    self._slots = threading.BoundedSemaphore(
+                        self.max_concurrency or getattr(settings, 'PASSWORD_HASH_MAX_CONCURRENCY', workers * 4)
+                    )
+                    # spawn: never fork a process that is running request threads.
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                    )
+        return self._executor
+
+    def _acquire(self, wait=True):
+
+        self._setup()
+        # wait=False: give up after PASSWORD_HASH_QUEUE_TIMEOUT; True: wait as long as it takes.
+        timeout = None if wait is True else getattr(settings, 'PASSWORD_HASH_QUEUE_TIMEOUT', 5)
+        if not self._slots.acquire(timeout=timeout):
+            with self._stats_lock:
+                self.rejected += 1
+            raise HashingUnavailable()
+
+    def _record(self, requested_at, started_at):
+
+        queued = max(started_at - requested_at, 0.0)
+        with self._stats_lock:
+            self.jobs += 1
+            self.queue_seconds_total += queued
+            self.queue_seconds_max = max(self.queue_seconds_max, queued)
+            self._recent.append(queued)
+
+    def run(self, fn, *args):
+        """Runs ``fn(*args)`` on the pool and blocks the calling thread until it is done."""
+        requested_at = time.time()
+        self._acquire(wait=False)
+        try:
+            started_at, result = self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+        self._record(requested_at, started_at)
+        return result
+
+    async def arun(self, fn, *args):
+        """Like run(), but awaits the pool without holding a thread while hashing."""
+        requested_at = time.time()
+        await asyncio.to_thread(self._acquire, False)
+        try:
+            started_at, result = await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            self._slots.release()
+        self._record(requested_at, started_at)
+        return result
+
+    def make_many(self, raw_passwords, chunk_size=32):
+        """
+        Hashes a list of passwords in parallel, ``chunk_size`` per job, and
+        returns the encoded hashes in order. Waits for free slots instead of
+        failing, so a bulk import only slows down interactive logins.
+        """
+        raw_passwords = list(raw_passwords)
+        requested_at = time.time()
+        futures = []
+        for start in range(0, len(raw_passwords), chunk_size):
+            self._acquire(wait=True)
+            future = self._executor.submit(_make_passwords, raw_passwords[start:start + chunk_size])
+            future.add_done_callback(lambda _: self._slots.release())
+            futures.append(future)
+
+        encoded = []
+        for future in futures:
+            started_at, hashes = future.result()
+            self._record(requested_at, started_at)
+            encoded.extend(hashes)
+        return encoded
+
+    def shutdown(self):
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def stats(self):
+
+        with self._stats_lock:
+            recent = sorted(self._recent)
+        return {
+            "jobs": self.jobs,
+            "rejected": self.rejected,
+            "queue_ms_avg": round(self.queue_seconds_total / self.jobs * 1000, 2) if self.jobs else None,
+            "queue_ms_p95": round(recent[min(int(len(recent) * 0.95), len(recent) - 1)] * 1000, 2) if recent else None,
+            "queue_ms_max": round(self.queue_seconds_max * 1000, 2),
+        }
+
+
+password_hasher_pool = PasswordHasherPool()
+
+
+def make_password(raw_password):
+
+    if raw_password is None or not password_hasher_pool.enabled:
+        return hashers.make_password(raw_password)
+    return password_hasher_pool.run(_make_password, raw_password)
+
+
+def check_user_password(user, raw_password):
+    """
+    ``user.check_password(raw_password)`` with the hashing on the pool. An
+    outdated hash is upgraded and saved, as the model method does.
+    """
+    if not password_hasher_pool.enabled:
+        return user.check_password(raw_password)
+    is_correct, must_update = password_hasher_pool.run(_check_password, raw_password, user.password)
+    if is_correct and must_update:
+        user.password = make_password(raw_password)
+        user.save(update_fields=['password'])
+    return is_correct
+
+
+def make_passwords(raw_passwords, pool=None):
+
+    pool = pool or password_hasher_pool
+    if not pool.enabled:
+        return [hashers.make_password(raw_password) for raw_password in raw_passwords]
+    return pool.make_many(raw_passwords)
+
+
+async def amake_password(raw_password):
+
+    if raw_password is None or not password_hasher_pool.enabled:
+        return hashers.make_password(raw_password)
+    return await password_hasher_pool.arun(_make_password, raw_password)
+
+
+async def acheck_user_password(user, raw_password):
+
+    if not password_hasher_pool.enabled:
+        return await user.acheck_password(raw_password)
+    is_correct, must_update = await password_hasher_pool.arun(_check_password, raw_password, user.password)
+    if is_correct and must_update:
+        user.password = await amake_password(raw_password)
+        await user.asave(update_fields=['password'])
+    return is_correct
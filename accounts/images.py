@@ -0,0 +1,137 @@
+"""
+Profile image variants.
+
+Uploads are stored as-is by the request (streamed to a temporary file and
+moved into place, see FILE_UPLOAD_HANDLERS); resizing happens afterwards
+on the background pool. Every variant is written as WebP plus a JPEG
+fallback at a path derived from the original's name, e.g.
+
+    user_7/avatar.png -> user_7/variants/avatar_1f2e3d4c_thumb.webp
+                         user_7/variants/avatar_1f2e3d4c_thumb.jpg
+
+The hash is of the original's full name, so originals that share a stem
+(avatar.png / avatar.jpg, or uploads from different users that all land in
+user_temp/ at registration) never share variant files. A new upload gets a
+new original name, so variant URLs change with it and can be cached forever.
+"""
+import hashlib, os
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from core.background import submit
+
+# name -> (max size in px, crop to a square)
+DEFAULT_VARIANTS = {
+    'thumb': (128, True),
+    'medium': (512, False),
+}
+FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def variant_specs():
+    return getattr(settings, 'PROFILE_IMAGE_VARIANTS', DEFAULT_VARIANTS)
+
+
+def variant_path(original_name, variant, fmt):
+
+    directory, filename = os.path.split(original_name)
+    stem = os.path.splitext(filename)[0]
+    digest = hashlib.sha1(original_name.encode()).hexdigest()[:8]
+    return os.path.join(directory, 'variants', f"{stem}_{digest}_{variant}.{EXTENSIONS[fmt]}")
+
+
+def _render(image, size, crop):
+
+    if crop:
+        return ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return resized
+
+
+def _save(image, path, fmt):
+
+    buffer = BytesIO()
+    quality = getattr(settings, 'PROFILE_IMAGE_QUALITY', 82)
+    if fmt == 'jpeg':
+        image.convert('RGB').save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=quality, method=4)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    return default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+def generate_variants(user_id, original_name):
+    """
+    Renders every variant of ``original_name`` and records the paths on the
+    user, unless the user has uploaded another image in the meantime.
+    Variants of the previous image are deleted.
+    """
+    from .authentication import token_cache
+    from .models import User
+
+    with default_storage.open(original_name, 'rb') as original:
+        with Image.open(original) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            variants = {}
+            for variant, (size, crop) in variant_specs().items():
+                rendered = _render(image, size, crop)
+                variants[variant] = {
+                    fmt: _save(rendered, variant_path(original_name, variant, fmt), pil_format)
+                    for fmt, pil_format in FORMATS
+                }
+
+    previous = User.objects.filter(pk=user_id).values_list('image_variants', flat=True).first() or {}
+    if User.objects.filter(pk=user_id, image=original_name).update(image_variants=variants, updated_at=timezone.now()):
+        token_cache.invalidate_user(user_id)
+        stale, keep = previous, {path for formats in variants.values() for path in formats.values()}
+    else:
+        # Replaced (or removed) while we were rendering; drop what we just wrote.
+        stale, keep = variants, set()
+
+    for formats in stale.values():
+        for path in formats.values():
+            if path not in keep:
+                default_storage.delete(path)
+    return variants
+
+
+def schedule_variants(user):
+    """Queues variant generation for the user's current image once the transaction commits."""
+    if user.image:
+        user_id, name = user.pk, user.image.name
+        transaction.on_commit(lambda: submit(generate_variants, user_id, name))
+
+
+def _delete_files(variants):
+
+    for formats in variants.values():
+        for path in formats.values():
+            default_storage.delete(path)
+
+
+def discard_variants(variants):
+    """Deletes the files of replaced variants once the transaction commits."""
+    if variants:
+        transaction.on_commit(lambda: submit(_delete_files, variants))
+
+
+def variant_urls(user, request=None):
+
+    urls = {}
+    if not user.image:
+        return urls
+    for variant, formats in (user.image_variants or {}).items():
+        urls[variant] = {}
+        for fmt, path in formats.items():
+            url = default_storage.url(path)
+            urls[variant][fmt] = request.build_absolute_uri(url) if request else url
+    return urls
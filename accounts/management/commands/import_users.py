@@ -0,0 +1,61 @@
+import os, sys, time
+from urllib.parse import urlparse
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from accounts.bulk_import import IMPORT_TYPES, UserImporter, guess_import_type, read_rows
+from accounts.hashing import PasswordHasherPool
+
+
+class Command(BaseCommand):
+
+    help = "Bulk-create users from a CSV (with header) or NDJSON file, or stdin with '-'."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument('--type', choices=list(IMPORT_TYPES), default=None, help="Default: from the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processes hashing raw passwords.")
+        parser.add_argument('--activate', action='store_true', help="Create active users and skip activation emails.")
+        parser.add_argument('--no-email', action='store_true', help="Do not queue activation emails.")
+        parser.add_argument('--domain', default=None, help="Host used in activation links. Default: SITE_URL's host.")
+
+    def handle(self, *args, **options):
+        
+        path = options['path']
+        import_type = options['type'] or guess_import_type(path)
+        domain = options['domain'] or urlparse(getattr(settings, 'SITE_URL', '')).netloc or '127.0.0.1:8000'
+
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        pool = PasswordHasherPool(workers=options['workers'], max_concurrency=options['workers'] * 2)
+        importer = UserImporter(
+            batch_size=options['batch_size'],
+            activate=options['activate'],
+            send_activation=not options['no_email'],
+            domain=domain,
+            hasher_pool=pool,
+        )
+        started = time.monotonic()
+
+        def progress(report):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"rows={report['rows']} created={report['created']} failed={report['failed']} "
+                f"({report['rows'] / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+
+        try:
+            report = importer.run(read_rows(stream, import_type), progress=progress)
+        finally:
+            pool.shutdown()
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} of {report['rows']} rows in {time.monotonic() - started:.1f}s."
+        ))
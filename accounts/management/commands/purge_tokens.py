@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from accounts.tokens import purge_expired_tokens, token_ttl
+
+
+class Command(BaseCommand):
+
+    help = "Delete API tokens unused for longer than AUTH_TOKEN_TTL, in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+
+        if not token_ttl():
+            self.stdout.write("AUTH_TOKEN_TTL is 0; tokens never expire.")
+            return
+
+        deleted = purge_expired_tokens(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            progress=lambda total: self.stdout.write(f"purged={total}") if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired tokens."))
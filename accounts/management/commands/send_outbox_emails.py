@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from accounts.outbox import purge_sent_emails, send_outbox_batch
+
+
+class Command(BaseCommand):
+
+    help = "Send queued emails from the outbox in batches, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help="Keep polling the outbox instead of exiting when nothing is due.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep between polls when nothing is due.")
+        parser.add_argument('--purge-days', type=int, default=None, help="Delete sent emails older than this many days.")
+
+    def handle(self, *args, **options):
+        
+        while True:
+            result = send_outbox_batch(batch_size=options['batch_size'])
+            if result['fetched']:
+                self.stdout.write(
+                    f"fetched={result['fetched']} sent={result['sent']} failed={result['failed']}"
+                )
+                continue
+
+            if options['purge_days'] is not None:
+                deleted = purge_sent_emails(options['purge_days'])
+                if deleted:
+                    self.stdout.write(f"purged={deleted}")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_token_activity(apps, schema_editor):
+    # Existing tokens count as last used when they were issued.
+    Token = apps.get_model('authtoken', 'Token')
+    TokenActivity = apps.get_model('accounts', 'TokenActivity')
+
+    batch = []
+    for key, created in Token.objects.values_list('key', 'created').iterator(chunk_size=2000):
+        batch.append(TokenActivity(token_id=key, last_used_at=created))
+        if len(batch) >= 2000:
+            TokenActivity.objects.bulk_create(batch)
+            batch = []
+    TokenActivity.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_user_versions'),
+        ('authtoken', '0004_alter_tokenproxy_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenActivity',
+            fields=[
+                ('token', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity', serialize=False, to='authtoken.token')),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_token_activity, migrations.RunPython.noop),
+    ]
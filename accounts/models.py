@@ -1,18 +1,26 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 
 
 
 #custom call
 class UserManager(BaseUserManager):
     
-    def create_user(self, email, full_name=None, password=None, **extra_fields):
+    def create_user(self, email, full_name=None, password=None, password_hash=None, **extra_fields):
         
         if not email:
             raise ValueError("Email address is required")
         email = self.normalize_email(email)
         user = self.model(email=email, full_name=full_name, **extra_fields)
-        user.set_password(password)
+        if password_hash:
+            # Already hashed by the caller, e.g. on the pool with accounts.hashing.make_password().
+            user.password = password_hash
+        else:
+            user.set_password(password)
         user.save(using=self._db)
         
         return user
@@ -51,6 +59,12 @@ class User(AbstractUser):
         full_name = models.CharField(max_length=255, blank=True, null=True)
         address = models.CharField(max_length=255, blank=True, null=True)
         image = models.ImageField(upload_to=user_directory_path, null=True, blank=True)
+        # {"thumb": {"webp": path, "jpeg": path}, ...}, filled in by accounts.images.
+        image_variants = models.JSONField(default=dict, blank=True)
+        # Versions behind the profile / device list ETags. Queryset .update()
+        # skips auto_now, so bulk writers must set updated_at themselves.
+        updated_at = models.DateTimeField(auto_now=True)
+        devices_version = models.PositiveIntegerField(default=0)
         email = models.EmailField(unique=True)
 
         is_active = models.BooleanField(default=False)
@@ -60,10 +74,62 @@ class User(AbstractUser):
         username = models.CharField(max_length=150)
         USERNAME_FIELD = 'email'
         REQUIRED_FIELDS = ['username','full_name']
+
+        class Meta(AbstractUser.Meta):
+            # On PostgreSQL iexact/icontains compile to UPPER(col) = / LIKE UPPER(...),
+            # so the case-insensitive indexes are built over UPPER(col).
+            indexes = [
+                # email__iexact (user directory)
+                models.Index(Upper('email'), name='user_email_upper_idx'),
+                # email__icontains (user directory, payment admin)
+                GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='user_email_trgm_idx'),
+                GinIndex(OpClass(Upper('full_name'), name='gin_trgm_ops'), name='user_full_name_trgm_idx'),
+                GinIndex(fields=['phone'], opclasses=['gin_trgm_ops'], name='user_phone_trgm_idx'),
+                models.Index(fields=['user_type', 'is_active', 'id'], name='user_type_active_idx'),
+            ]
         
     
 
         def __str__(self):
             return f"{self.username} ({self.user_type})"
-        
 
+
+class EmailOutbox(models.Model):
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    content_subtype = models.CharField(max_length=10, default='html')
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # NULL once delivery was given up after EMAIL_OUTBOX_MAX_ATTEMPTS.
+    next_attempt_at = models.DateTimeField(default=timezone.now, blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.CharField(max_length=255, blank=True, null=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at', 'id'],
+                condition=models.Q(sent_at__isnull=True),
+                name='email_outbox_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} [{'sent' if self.sent_at else 'pending'}]"
+
+
+class TokenActivity(models.Model):
+    """
+    Last use of an API token, kept beside DRF's Token table. Tokens expire
+    AUTH_TOKEN_TTL seconds after this (see accounts.tokens); it is written
+    at most once per AUTH_TOKEN_TOUCH_INTERVAL per token.
+    """
+
+    token = models.OneToOneField(Token, primary_key=True, on_delete=models.CASCADE, related_name='activity')
+    last_used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.token_id[:8]}… last used {self.last_used_at:%Y-%m-%d %H:%M}"
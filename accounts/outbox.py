@@ -0,0 +1,168 @@
+import random, threading
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Min
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from core.background import submit, submit_at
+from .models import EmailOutbox
+
+_send_lock = threading.Lock()
+_send_scheduled = False
+
+
+def activation_link(user, domain):
+
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    return f"http://{domain}/api/accounts/activate/{uid}/{token}/"
+
+
+def verification_email(user, activation_link):
+
+    return EmailOutbox(
+        to_email=user.email,
+        subject='Verify your email address',
+        body=render_to_string('accounts/verify_email.html', {
+            'user': user,
+            'activation_link': activation_link,
+        }),
+        content_subtype='html',
+    )
+
+
+def enqueue_emails(emails):
+    """
+    Writes unsaved EmailOutbox rows in the caller's transaction. They are
+    delivered after commit by the background sender (or by
+    ``manage.py send_outbox_emails``), so no SMTP work happens in the request.
+    """
+    emails = EmailOutbox.objects.bulk_create(emails)
+    if emails and getattr(settings, 'EMAIL_OUTBOX_AUTO_SEND', True):
+        transaction.on_commit(schedule_send)
+    return emails
+
+
+def enqueue_email(email):
+
+    return enqueue_emails([email])[0]
+
+
+def schedule_send():
+
+    global _send_scheduled
+    with _send_lock:
+        if _send_scheduled:
+            return
+        _send_scheduled = True
+    submit(_send_in_background)
+
+
+def _send_in_background():
+
+    global _send_scheduled
+    with _send_lock:
+        _send_scheduled = False
+    while send_outbox_batch()['fetched']:
+        pass
+    schedule_retry()
+
+
+def schedule_retry():
+    """
+    Wakes the sender again when the earliest unsent email is due, so failed
+    sends are retried on their backoff even if nothing new is enqueued.
+    """
+    due = EmailOutbox.objects.filter(sent_at__isnull=True).aggregate(due=Min('next_attempt_at'))['due']
+    if due is not None:
+        submit_at('email-outbox-retry', due, _send_in_background)
+
+
+def _retry_delay(attempts):
+
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_BACKOFF', 30)
+    cap = getattr(settings, 'EMAIL_OUTBOX_RETRY_MAX_DELAY', 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap) * random.uniform(0.5, 1.0))
+
+
+def claim_outbox_batch(batch_size):
+    """
+    Claims up to ``batch_size`` due emails in a short transaction by pushing
+    their next_attempt_at EMAIL_OUTBOX_CLAIM_TIMEOUT seconds ahead. Other
+    senders skip them until then, and a sender that dies mid-batch leaves
+    them to be picked up again once the claim runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            EmailOutbox.objects.filter(sent_at__isnull=True, next_attempt_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if rows:
+            EmailOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(
+                next_attempt_at=now + timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_CLAIM_TIMEOUT', 600)),
+            )
+    return rows
+
+
+def send_outbox_batch(batch_size=None):
+    """
+    Sends one batch of due emails over a single SMTP connection. The batch
+    is claimed and committed first, so no transaction or row lock is held
+    while talking to SMTP. Failed sends are retried with exponential backoff
+    (with jitter) until EMAIL_OUTBOX_MAX_ATTEMPTS, after which
+    next_attempt_at is cleared and the row is left for inspection.
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 100)
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 8)
+
+    rows = claim_outbox_batch(batch_size)
+    if not rows:
+        return {"fetched": 0, "sent": 0, "failed": 0}
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        for row in rows:
+            message = EmailMessage(
+                subject=row.subject,
+                body=row.body,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[row.to_email],
+                connection=connection,
+            )
+            message.content_subtype = row.content_subtype
+            try:
+                # No-op while the connection is up; reopens it after a failure.
+                connection.open()
+                message.send()
+            except Exception as e:
+                connection.close()
+                row.attempts += 1
+                row.last_error = str(e)[:255]
+                row.next_attempt_at = timezone.now() + _retry_delay(row.attempts) if row.attempts < max_attempts else None
+                failed += 1
+            else:
+                row.attempts += 1
+                row.sent_at = timezone.now()
+                row.last_error = None
+                sent += 1
+    finally:
+        connection.close()
+
+    EmailOutbox.objects.bulk_update(rows, ['attempts', 'next_attempt_at', 'sent_at', 'last_error'])
+
+    return {"fetched": len(rows), "sent": sent, "failed": failed}
+
+
+def purge_sent_emails(older_than_days):
+
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = EmailOutbox.objects.filter(sent_at__lt=cutoff).delete()
+    return deleted
@@ -1,14 +1,13 @@
 from django.conf import settings
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from rest_framework.authtoken.models import Token
-from django.core.mail import EmailMessage
-from django.utils.http import urlsafe_base64_encode
-from django.utils.encoding import force_bytes
-from django.contrib.auth.tokens import default_token_generator
-from django.template.loader import render_to_string
+from django.contrib.auth.hashers import identify_hasher
+from django.db import transaction
 from django.contrib.sites.shortcuts import get_current_site
+from .images import schedule_variants, variant_urls
 from .models import User
+from .outbox import activation_link, enqueue_email, verification_email
+from .tokens import obtain_token
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -39,49 +38,38 @@ class RegisterSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         
         validated_data.pop('staff_security_code', None)
-        user = User.objects.create_user(
-            email=validated_data['email'],
-            full_name=validated_data.get('full_name', ''),
-            password=validated_data['password'],
-            username=validated_data.get('username', ''),
-            phone=validated_data.get('phone', ''),
-            address=validated_data.get('address', ''),
-            image=validated_data.get('image', None),
-            user_type=validated_data.get('user_type', 'USER'),
-        )
-        user.is_active = False
-        user.save()
-
-        request = self.context.get('request')
-        current_site = get_current_site(request)
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-        token = default_token_generator.make_token(user)
-        activation_link = f"http://{current_site.domain}/api/accounts/activate/{uid}/{token}/"
-
-        
-        message = render_to_string('accounts/verify_email.html', {
-            'user': user,
-            'activation_link': activation_link,
-        })
-
-        mail = EmailMessage(
-            subject='Verify your email address',
-            body=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[user.email],
-        )
-
-        mail.content_subtype = 'html'
-        mail.send()
-
-        print(f"\n📧 Verification link for {user.email}: {activation_link}\n")
-
-        api_token, _ = Token.objects.get_or_create(user=user)
+        # Set by the register views, which hash on the pool before saving.
+        password_hash = validated_data.pop('password_hash', None)
+        # The user, its token and the verification email commit together;
+        # the email itself is sent by the outbox worker after commit.
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email=validated_data['email'],
+                full_name=validated_data.get('full_name', ''),
+                password=validated_data['password'],
+                password_hash=password_hash,
+                username=validated_data.get('username', ''),
+                phone=validated_data.get('phone', ''),
+                address=validated_data.get('address', ''),
+                image=validated_data.get('image', None),
+                user_type=validated_data.get('user_type', 'USER'),
+                is_active=False,
+            )
+
+            request = self.context.get('request')
+            link = activation_link(user, get_current_site(request).domain)
+
+            enqueue_email(verification_email(user, link))
+            schedule_variants(user)
+
+            api_token = obtain_token(user)
+
+        print(f"\n📧 Verification link for {user.email}: {link}\n")
 
         return {
             "user": user,
             "token": api_token.key,
-            "activation_link": activation_link
+            "activation_link": link
         }
 
 
@@ -92,7 +80,11 @@ class LoginSerializer(serializers.Serializer):
     staff_security_code = serializers.CharField(write_only=True, required=False)
     
     def validate(self, data):
-        user = authenticate(email=data.get('email'), password=data.get('password'))
+        # The login views verify the password on the hashing pool and pass the result in.
+        if 'user' in self.context:
+            user = self.context['user']
+        else:
+            user = authenticate(email=data.get('email'), password=data.get('password'))
         
         if not user:
             raise serializers.ValidationError("Invalid email or password.")
@@ -110,12 +102,58 @@ class LoginSerializer(serializers.Serializer):
 
 class UserSerializer(serializers.ModelSerializer):
     
+    image_variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'email', 'username', 'full_name', 'phone', 'address', 'image', 'image_variants', 'user_type']
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj, self.context.get('request'))
+
+
+class UserDirectorySerializer(serializers.ModelSerializer):
+    """Slim row for the staff user directory; the view loads only these columns."""
+
     class Meta:
         model = User
-        fields = ['id', 'email', 'username', 'full_name', 'phone', 'address', 'image', 'user_type']
+        fields = ['id', 'email', 'username', 'full_name', 'phone', 'user_type', 'is_active', 'date_joined']
+
+
+
+
 
 
 
 
+class BulkUserSerializer(serializers.ModelSerializer):
+    """
+    One row of a bulk import. Email uniqueness is checked per batch by
+    accounts.bulk_import instead of one query per row.
+    """
 
+    password = serializers.CharField(write_only=True, required=False, allow_blank=True)
+    password_hash = serializers.CharField(write_only=True, required=False, allow_blank=True)
 
+    class Meta:
+        model = User
+        fields = ['email', 'username', 'full_name', 'phone', 'address', 'user_type', 'password', 'password_hash']
+        extra_kwargs = {'email': {'validators': []}}
+
+    def validate_user_type(self, value):
+        if value == 'ADMIN':
+            raise serializers.ValidationError("Admins cannot be bulk imported.")
+        return value
+
+    def validate_password_hash(self, value):
+        if value:
+            try:
+                identify_hasher(value)
+            except ValueError:
+                raise serializers.ValidationError("Unknown password hash format.")
+        return value
+
+    def validate(self, attrs):
+        if attrs.get('password') and attrs.get('password_hash'):
+            raise serializers.ValidationError("Give either password or password_hash, not both.")
+        return attrs
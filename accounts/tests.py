@@ -1,3 +1,382 @@
-from django.test import TestCase
+import io, json, pickle, tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import hashers
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from .authentication import CachedTokenAuthentication, _shared_key, token_cache
+from .bulk_import import UserImporter, read_rows
+from .hashing import HashingUnavailable, PasswordHasherPool, _check_password, _make_password, password_hasher_pool
+from .models import EmailOutbox, TokenActivity, User
+from .outbox import claim_outbox_batch, enqueue_emails, schedule_retry, send_outbox_batch
+from .tokens import obtain_token, purge_expired_tokens
 
-# Create your tests here.
+class FailingEmailBackend(EmailBackend):
+    """Refuses mail to addresses containing "fail", like an SMTP server rejecting them."""
+
+    def send_messages(self, messages):
+        if any('fail' in message.to[0] for message in messages):
+            raise OSError("SMTP unavailable")
+        return super().send_messages(messages)
+
+
+SHARED_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(prefix='token-cache-'),
+    },
+}
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class TokenCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_cache._local.clear()
+        self.user = User.objects.create_user(email='cached@example.com', password='pw12345!', username='cached', is_active=True)
+        self.token = Token.objects.create(user=self.user)
+
+    def authenticate(self, key=None):
+        return CachedTokenAuthentication().authenticate_credentials(key or self.token.key)[0]
+
+    def test_shared_layer_never_holds_the_user_row(self):
+        self.authenticate()
+
+        entry = cache.get(_shared_key(self.token.key))
+        self.assertEqual(entry[0], self.user.pk)
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(entry))
+
+    def test_shared_hit_loads_the_user(self):
+        self.authenticate()
+        token_cache._local.clear()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(), self.user)
+
+    def test_each_lookup_gets_its_own_user(self):
+        first = self.authenticate()
+        first.full_name = 'Changed in one request'
+
+        with self.assertNumQueries(0):
+            second = self.authenticate()
+        self.assertIsNot(second, first)
+        self.assertNotEqual(second.full_name, first.full_name)
+
+    def test_user_save_invalidates_cached_tokens(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_token_delete_invalidates_the_cache(self):
+        key = self.token.key
+        self.authenticate()
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(key)
+
+
+class PasswordHashingTests(TestCase):
+
+    def test_model_password_methods_do_not_use_the_pool(self):
+        with mock.patch.object(password_hasher_pool, 'run', side_effect=HashingUnavailable):
+            user = User.objects.create_user(email='stock@example.com', password='pw12345!', username='stock')
+            self.assertTrue(user.check_password('pw12345!'))
+
+    def test_pool_hashes_and_checks_in_worker_processes(self):
+        pool = PasswordHasherPool(workers=1, max_concurrency=1)
+        self.addCleanup(pool.shutdown)
+
+        encoded = pool.run(_make_password, 'pw12345!')
+        self.assertTrue(hashers.check_password('pw12345!', encoded))
+        self.assertEqual(pool.run(_check_password, 'pw12345!', encoded), (True, False))
+        self.assertEqual(pool.run(_check_password, 'wrong', encoded), (False, False))
+        self.assertEqual(pool.make_many(['a', 'b', 'c'], chunk_size=2)[2][:6], 'pbkdf2')
+        self.assertEqual(pool.stats()['jobs'], 5)
+
+    @override_settings(PASSWORD_HASH_QUEUE_TIMEOUT=0)
+    def test_saturated_pool_rejects_instead_of_queueing(self):
+        pool = PasswordHasherPool(workers=1, max_concurrency=1)
+        self.addCleanup(pool.shutdown)
+        pool._setup()
+        pool._slots.acquire()
+
+        with self.assertRaises(HashingUnavailable):
+            pool.run(_make_password, 'pw12345!')
+        self.assertEqual(pool.stats()['rejected'], 1)
+
+    def test_login_and_register_answer_503_when_the_pool_is_saturated(self):
+        User.objects.create_user(email='busy@example.com', password='pw12345!', username='busy', is_active=True)
+
+        with mock.patch('accounts.views.check_user_password', side_effect=HashingUnavailable):
+            response = self.client.post('/api/accounts/login/', {'email': 'busy@example.com', 'password': 'pw12345!'})
+        self.assertEqual(response.status_code, 503)
+
+        with mock.patch('accounts.views.make_password', side_effect=HashingUnavailable):
+            response = self.client.post('/api/accounts/register/', {
+                'email': 'new@example.com', 'username': 'new', 'full_name': 'New', 'password': 'pw12345!',
+            })
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(User.objects.filter(email='new@example.com').exists())
+
+    def test_login_checks_the_password_through_the_pool_helper(self):
+        User.objects.create_user(email='login@example.com', password='pw12345!', username='login', is_active=True)
+
+        with mock.patch('accounts.views.check_user_password', wraps=lambda user, raw: user.check_password(raw)) as check:
+            ok = self.client.post('/api/accounts/login/', {'email': 'login@example.com', 'password': 'pw12345!'})
+            wrong = self.client.post('/api/accounts/login/', {'email': 'login@example.com', 'password': 'nope'})
+
+        self.assertEqual((ok.status_code, wrong.status_code), (200, 400))
+        self.assertEqual(check.call_count, 2)
+
+
+@override_settings(
+    EMAIL_BACKEND='accounts.tests.FailingEmailBackend', EMAIL_OUTBOX_AUTO_SEND=False,
+    EMAIL_OUTBOX_RETRY_BACKOFF=30, EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+)
+class EmailOutboxTests(TestCase):
+
+    def queue(self, *addresses):
+        return enqueue_emails([EmailOutbox(to_email=address, subject='Hi', body='Body') for address in addresses])
+
+    def test_batch_sends_due_emails(self):
+        self.queue('one@example.com', 'two@example.com')
+
+        self.assertEqual(send_outbox_batch(), {"fetched": 2, "sent": 2, "failed": 0})
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(EmailOutbox.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(send_outbox_batch()['fetched'], 0)
+
+    def test_failed_send_is_retried_with_backoff_then_given_up(self):
+        self.queue('fail@example.com', 'ok@example.com')
+
+        self.assertEqual(send_outbox_batch(), {"fetched": 2, "sent": 1, "failed": 1})
+        row = EmailOutbox.objects.get(to_email='fail@example.com')
+        self.assertEqual((row.attempts, row.last_error), (1, "SMTP unavailable"))
+        self.assertGreater(row.next_attempt_at, timezone.now() + timedelta(seconds=14))
+
+        EmailOutbox.objects.filter(pk=row.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(send_outbox_batch()['failed'], 1)
+        row.refresh_from_db()
+        # EMAIL_OUTBOX_MAX_ATTEMPTS reached: left for inspection.
+        self.assertEqual(row.attempts, 2)
+        self.assertIsNone(row.next_attempt_at)
+
+    def test_claimed_rows_are_hidden_from_other_senders(self):
+        self.queue('one@example.com', 'two@example.com')
+
+        self.assertEqual(len(claim_outbox_batch(10)), 2)
+        self.assertEqual(claim_outbox_batch(10), [])
+        self.assertEqual(send_outbox_batch()['fetched'], 0)
+
+    def test_claim_is_committed_before_sending(self):
+        self.queue('one@example.com')
+        depth = len(connection.savepoint_ids)
+        seen = []
+
+        def send_messages(backend, messages):
+            seen.append(len(connection.savepoint_ids))
+            return len(messages)
+
+        with mock.patch.object(FailingEmailBackend, 'send_messages', send_messages):
+            send_outbox_batch()
+
+        # No atomic block (savepoint, inside the test's transaction) is open around the send.
+        self.assertEqual(seen, [depth])
+
+    def test_retry_is_scheduled_for_the_earliest_unsent_email(self):
+        soon, later = self.queue('soon@example.com', 'later@example.com')
+        due = timezone.now() + timedelta(minutes=5)
+        EmailOutbox.objects.filter(pk=soon.pk).update(next_attempt_at=due)
+        EmailOutbox.objects.filter(pk=later.pk).update(next_attempt_at=due + timedelta(minutes=5))
+
+        with mock.patch('accounts.outbox.submit_at') as submit_at:
+            schedule_retry()
+
+        name, when, _ = submit_at.call_args.args
+        self.assertEqual((name, when), ('email-outbox-retry', due))
+
+
+@override_settings(EMAIL_OUTBOX_AUTO_SEND=False, USER_IMPORT_HASH_WORKERS=0)
+class UserImportTests(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_user(email='staff@example.com', password=None, username='staff', is_staff=True, is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def import_csv(self, body, **params):
+        query = '&'.join(f'{key}={value}' for key, value in params.items())
+        return self.client.post(f'/api/accounts/users/import/?{query}', body, content_type='text/csv')
+
+    def test_rows_are_created_in_batches_with_tokens_and_activation_emails(self):
+        body = (
+            "email,username,password,password_hash\n"
+            "a@example.com,a,pw12345!,\n"
+            f"b@example.com,b,,{hashers.make_password('secret')}\n"
+            "c@example.com,c,,\n"
+        )
+
+        report = self.import_csv(body, batch_size=2).json()
+
+        self.assertEqual((report['created'], report['failed'], report['batches']), (3, 0, 2))
+        a, b, c = (User.objects.get(email=f'{name}@example.com') for name in 'abc')
+        self.assertTrue(a.check_password('pw12345!'))
+        self.assertTrue(b.check_password('secret'))
+        self.assertFalse(c.has_usable_password())
+        self.assertEqual(Token.objects.filter(user__in=[a, b, c]).count(), 3)
+        self.assertEqual(EmailOutbox.objects.count(), 3)
+
+    def test_invalid_and_duplicate_rows_are_reported_by_line(self):
+        body = (
+            "email,username,user_type\n"
+            "staff@example.com,dup,USER\n"
+            "new@example.com,new,USER\n"
+            "NEW@example.com,again,USER\n"
+            "boss@example.com,boss,ADMIN\n"
+            "not-an-email,x,USER\n"
+        )
+
+        report = self.import_csv(body, activate='true').json()
+
+        self.assertEqual((report['created'], report['failed']), (1, 4))
+        self.assertEqual(sorted(error['line'] for error in report['errors']), [2, 4, 5, 6])
+        self.assertTrue(User.objects.get(email='new@example.com').is_active)
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_batch_size_is_validated(self):
+        for value in ('0', 'abc', '10001'):
+            response = self.import_csv("email\n", batch_size=value)
+            self.assertEqual(response.status_code, 400, value)
+
+    def test_import_is_staff_only(self):
+        self.client.force_authenticate(User.objects.create_user(email='user@example.com', password=None, username='user', is_active=True))
+
+        self.assertEqual(self.import_csv("email\n").status_code, 403)
+
+    def test_ndjson_rows(self):
+        lines = [json.dumps({"email": "n1@example.com", "username": "n1"}), "not json", json.dumps({"email": "n2@example.com", "username": "n2"})]
+
+        report = UserImporter(send_activation=False).run(read_rows(io.BytesIO("\n".join(lines).encode()), 'ndjson'))
+
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        self.assertEqual(report['errors'][0]['line'], 2)
+
+
+class ProfileETagTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='etag@example.com', password=None, username='etag', full_name='Before', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_matching_if_none_match_answers_304(self):
+        first = self.client.get('/api/accounts/profile/')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('private', first['Cache-Control'])
+
+        again = self.client.get('/api/accounts/profile/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], first['ETag'])
+        self.assertEqual(self.client.get('/api/accounts/profile/', HTTP_IF_NONE_MATCH=f"W/{first['ETag']}").status_code, 304)
+
+    def test_update_changes_the_etag(self):
+        etag = self.client.get('/api/accounts/profile/')['ETag']
+
+        self.client.patch('/api/accounts/profile/', {'full_name': 'After'})
+
+        response = self.client.get('/api/accounts/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['profile']['full_name'], 'After')
+
+
+@override_settings(AUTH_TOKEN_TTL=3600, AUTH_TOKEN_TOUCH_INTERVAL=60)
+class TokenExpiryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_cache._local.clear()
+        self.user = User.objects.create_user(email='expiry@example.com', password=None, username='expiry', is_active=True)
+        self.token = Token.objects.create(user=self.user)
+
+    def age(self, token, seconds):
+        TokenActivity.objects.filter(token_id=token.key).update(last_used_at=timezone.now() - timedelta(seconds=seconds))
+        token_cache.invalidate(token.key)
+
+    def last_used(self, token):
+        return TokenActivity.objects.get(token_id=token.key).last_used_at
+
+    def test_expired_token_is_rejected(self):
+        self.age(self.token, 3601)
+
+        response = self.client.get('/api/accounts/profile/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_last_use_is_written_once_per_touch_interval(self):
+        self.age(self.token, 30)
+        before = self.last_used(self.token)
+
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(self.last_used(self.token), before)
+
+        self.age(self.token, 61)
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertGreater(self.last_used(self.token), timezone.now() - timedelta(seconds=5))
+
+    def test_obtain_token_replaces_only_an_expired_token(self):
+        self.age(self.token, 120)
+        self.assertEqual(obtain_token(self.user).key, self.token.key)
+
+        self.age(self.token, 3601)
+        fresh = obtain_token(self.user)
+        self.assertNotEqual(fresh.key, self.token.key)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+
+    def test_purge_deletes_expired_tokens_in_batches(self):
+        expired = [self.token] + [
+            Token.objects.create(user=User.objects.create_user(email=f'old{n}@example.com', password=None, username=f'old{n}'))
+            for n in range(2)
+        ]
+        for token in expired:
+            self.age(token, 3601)
+        kept = Token.objects.create(user=User.objects.create_user(email='fresh@example.com', password=None, username='fresh'))
+        batches = []
+
+        self.assertEqual(purge_expired_tokens(batch_size=2, progress=batches.append), 3)
+        self.assertEqual(batches, [2, 3])
+        self.assertEqual(list(Token.objects.values_list('key', flat=True)), [kept.key])
+
+    @override_settings(AUTH_TOKEN_TTL=0)
+    def test_purge_is_a_no_op_without_expiry(self):
+        self.age(self.token, 10 ** 6)
+        out = io.StringIO()
+
+        call_command('purge_tokens', stdout=out)
+
+        self.assertIn("never expire", out.getvalue())
+        self.assertTrue(Token.objects.filter(key=self.token.key).exists())
+
+
+class AccountMetricsTests(TestCase):
+
+    def test_metrics_are_staff_only(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='plain@example.com', password=None, username='plain', is_active=True))
+        self.assertEqual(client.get('/api/accounts/metrics/').status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(email='ops@example.com', password=None, username='ops', is_staff=True, is_active=True))
+        body = client.get('/api/accounts/metrics/').json()
+        self.assertEqual(set(body), {'auth_token_cache', 'password_hashing'})
@@ -0,0 +1,117 @@
+"""
+Expiring API tokens.
+
+DRF's Token has no expiry, so the last use of each token is kept in
+TokenActivity. A token expires AUTH_TOKEN_TTL seconds after its last use
+(sliding expiry; 0 disables expiry). Authentication only writes the new
+last use once it is AUTH_TOKEN_TOUCH_INTERVAL seconds old, so a busy
+client costs one UPDATE per interval rather than one per request.
+Expired rows are removed by ``manage.py purge_tokens``.
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from .models import TokenActivity
+
+
+def token_ttl():
+    return getattr(settings, 'AUTH_TOKEN_TTL', 30 * 24 * 3600)
+
+
+def touch_interval():
+    return getattr(settings, 'AUTH_TOKEN_TOUCH_INTERVAL', 3600)
+
+
+def last_used_at(token):
+    """Last use of a token fetched with select_related('activity')."""
+    try:
+        return token.activity.last_used_at
+    except TokenActivity.DoesNotExist:
+        return token.created
+
+
+def is_expired(last_used, now=None):
+
+    ttl = token_ttl()
+    return bool(ttl) and last_used + timedelta(seconds=ttl) <= (now or timezone.now())
+
+
+def needs_touch(last_used, now=None):
+
+    return (now or timezone.now()) - last_used >= timedelta(seconds=touch_interval())
+
+
+def touch(key, now=None):
+
+    now = now or timezone.now()
+    if not TokenActivity.objects.filter(token_id=key).update(last_used_at=now):
+        TokenActivity.objects.get_or_create(token_id=key, defaults={'last_used_at': now})
+    return now
+
+
+def obtain_token(user):
+    """
+    The user's token for a fresh login: the existing one unless it has
+    expired, in which case it is replaced. Either way it counts as used now.
+    """
+    with transaction.atomic():
+        token, created = Token.objects.select_related('activity').get_or_create(user=user)
+        if not created and is_expired(last_used_at(token)):
+            token.delete()
+            token = Token.objects.create(user=user)
+        elif not created:
+            touch(token.key)
+    return token
+
+
+def bulk_create_tokens(users):
+    """Tokens (with their activity rows) for freshly bulk-created users."""
+    tokens = Token.objects.bulk_create([Token(key=Token.generate_key(), user=user) for user in users])
+    now = timezone.now()
+    TokenActivity.objects.bulk_create([TokenActivity(token_id=token.key, last_used_at=now) for token in tokens])
+    return tokens
+
+
+def purge_expired_tokens(batch_size=1000, pause=0.0, progress=None):
+    """
+    Deletes expired tokens ``batch_size`` at a time, each batch in its own
+    short transaction that skips rows locked by a concurrent touch, so the
+    table is never locked for long. Returns the number of tokens deleted.
+    """
+    ttl = token_ttl()
+    if not ttl:
+        return 0
+
+    cutoff = timezone.now() - timedelta(seconds=ttl)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            keys = list(
+                TokenActivity.objects.select_for_update(skip_locked=True)
+                .filter(last_used_at__lt=cutoff)
+                .order_by('last_used_at')
+                .values_list('token_id', flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+            Token.objects.filter(pk__in=keys).delete()
+        deleted += len(keys)
+        if progress:
+            progress(deleted)
+        if len(keys) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+@receiver(post_save, sender=Token)
+def start_token_activity(sender, instance, created, **kwargs):
+
+    if created:
+        TokenActivity.objects.get_or_create(token_id=instance.key, defaults={'last_used_at': instance.created})
@@ -1,10 +1,14 @@
 from django.urls import path
+from .async_views import login_async, register_async
 from .views import (
     RegisterView,
     LoginView,
     LogoutView,
     ProfileView,
     ActivateAccountView,
+    UserImportView,
+    UserDirectoryView,
+    AccountMetricsView,
 )
 
 urlpatterns = [
@@ -13,9 +17,19 @@ urlpatterns = [
     
     path('login/', LoginView.as_view(), name='login'),
 
+    path('register/async/', register_async, name='register-async'),
+
+    path('login/async/', login_async, name='login-async'),
+
     path('logout/', LogoutView.as_view(), name='logout'),
 
     path('profile/', ProfileView.as_view(), name='profile'),
     
     path('activate/<uidb64>/<token>/', ActivateAccountView.as_view(), name='activate'),
+
+    path('users/', UserDirectoryView.as_view(), name='user-directory'),
+
+    path('users/import/', UserImportView.as_view(), name='user-import'),
+
+    path('metrics/', AccountMetricsView.as_view(), name='account-metrics'),
 ]
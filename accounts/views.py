@@ -1,16 +1,73 @@
+import re
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.authtoken.models import Token
 from django.contrib.auth import logout
 from django.utils.http import urlsafe_base64_decode
 from django.contrib.auth.tokens import default_token_generator
 from django.shortcuts import get_object_or_404, render
+from django.contrib.sites.shortcuts import get_current_site
+from rest_framework.exceptions import ValidationError
+from django.db.models import Q
+from core.conditional import make_etag, is_not_modified, not_modified, with_etag
+from .authentication import token_cache
+from .hashing import HashingUnavailable, check_user_password, make_password, password_hasher_pool
+from .bulk_import import IMPORT_TYPES, MAX_IMPORT_BATCH_SIZE, UserImporter, guess_import_type, import_hasher_pool, read_rows
+from .images import discard_variants, schedule_variants
 from .models import User
-from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
+from .pagination import UserDirectoryCursorPagination
+from .serializers import RegisterSerializer, LoginSerializer, UserSerializer, UserDirectorySerializer
+from .tokens import obtain_token
 
 
 
+def register_response(result):
+
+    return {
+        "message": "Registration successful! Please verify your email.",
+        "user": UserSerializer(result["user"]).data,
+        "token": result["token"],
+        "activation_link": result["activation_link"]
+    }
+
+
+def hashing_unavailable(exc):
+
+    return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+def authenticate_on_pool(email, password):
+    """
+    authenticate() for the login view with the hashing on the pool: None for
+    an unknown email, a wrong password or an inactive user. Raises
+    HashingUnavailable when the pool is saturated.
+    """
+    user = User.objects.filter(email=email).first() if email and password else None
+    if user is None:
+        # Hash once anyway so unknown emails take as long as wrong passwords.
+        if password:
+            make_password(password)
+        return None
+    if not (check_user_password(user, password) and user.is_active):
+        return None
+    return user
+
+
+def login_response(user, token):
+
+    return {
+        "message": "Login successful.",
+        "token": token.key,
+        "user": {
+            "id": user.id,
+            "email": user.email,
+            "username": user.username,
+            "full_name": user.full_name,
+            "user_type": user.user_type,
+        }
+    }
+
+
 class RegisterView(generics.CreateAPIView):
     
     queryset = User.objects.all()
@@ -20,38 +77,32 @@ class RegisterView(generics.CreateAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
+        try:
+            password_hash = make_password(serializer.validated_data['password'])
+        except HashingUnavailable as e:
+            return hashing_unavailable(e)
+        user = serializer.save(password_hash=password_hash)
 
-        return Response({
-            "message": "Registration successful! Please verify your email.",
-            "user": UserSerializer(user["user"]).data,
-            "token": user["token"],
-            "activation_link": user["activation_link"]
-        }, status=status.HTTP_201_CREATED)
+        return Response(register_response(user), status=status.HTTP_201_CREATED)
         
         
 class LoginView(APIView):
     
     permission_classes = [permissions.AllowAny]
+    # Clients still sending an expired token must be able to log in again.
+    authentication_classes = []
     
     def post(self, request):
-        serializer = LoginSerializer(data=request.data)
+        try:
+            user = authenticate_on_pool(request.data.get('email'), request.data.get('password'))
+        except HashingUnavailable as e:
+            return hashing_unavailable(e)
+        serializer = LoginSerializer(data=request.data, context={'user': user})
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
-        token, _ = Token.objects.get_or_create(user=user)
+        token = obtain_token(user)
         
-        return Response({
-            "message": "Login successful.",
-            "token": token.key,
-            "user": {
-                "id": user.id,
-                "email": user.email,
-                "username": user.username,
-                "full_name": user.full_name,
-                "user_type": user.user_type,
-            }   
-            
-        }, status=status.HTTP_200_OK)
+        return Response(login_response(user, token), status=status.HTTP_200_OK)
         
     
 
@@ -81,19 +132,38 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     
     def retrieve(self, request, *args, **kwargs):
         
+        # request.user may come from the token cache, so the version is read
+        # from the row; a match answers 304 without serializing anything.
+        updated_at = User.objects.filter(pk=request.user.pk).values_list('updated_at', flat=True).first()
+        etag = make_etag(request, request.user.pk, updated_at)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+
         user = self.get_object()
+        if user.updated_at != updated_at:
+            user = User.objects.get(pk=user.pk)
         serializer = self.get_serializer(user)
-        return Response({
+        return with_etag(Response({
             "profile": serializer.data
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK), etag)
         
         
     def update(self, request, *args, **kwargs):
         
-        user = self.get_object()
+        # request.user may be up to AUTH_TOKEN_LOCAL_TTL old, and save() writes
+        # every column, so write through a fresh row.
+        user = User.objects.get(pk=request.user.pk)
+        previous_image, previous_variants = user.image.name, user.image_variants
         serializer = self.get_serializer(user, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if 'image' in serializer.validated_data:
+            # The old variants describe the old image; drop them until the new ones are rendered.
+            serializer.save(image_variants={})
+        else:
+            serializer.save()
+        if user.image.name != previous_image:
+            discard_variants(previous_variants)
+            schedule_variants(user)
         return Response({
             "message": "Profile updated successfully.",
             "profile": serializer.data
@@ -121,3 +191,109 @@ class ActivateAccountView(APIView):
         else:
 
             return render(request, 'accounts/activation_failed.html')
+
+
+
+class UserImportView(APIView):
+    """
+    Staff-only bulk provisioning. Send a CSV (header row) or NDJSON file,
+    either as multipart ``file`` or as the raw request body. Columns: email,
+    username, full_name, phone, address, user_type and either password or
+    password_hash (a Django-format hash; the fast path for large imports).
+    ``?activate=true`` creates active users without activation emails.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        
+        upload = request.FILES.get('file') if request.content_type.startswith('multipart/') else None
+        import_type = request.query_params.get('type') or guess_import_type(
+            upload.name if upload else None, request.content_type,
+        )
+        if import_type not in IMPORT_TYPES:
+            raise ValidationError({"type": f"Choose one of: {', '.join(IMPORT_TYPES)}."})
+
+        stream = upload.file if upload else request.stream
+        if stream is None:
+            raise ValidationError({"file": "Send a CSV or NDJSON file."})
+
+        try:
+            batch_size = int(request.query_params.get('batch_size', 1000))
+        except ValueError:
+            batch_size = 0
+        if not 1 <= batch_size <= MAX_IMPORT_BATCH_SIZE:
+            raise ValidationError({"batch_size": f"Use a whole number from 1 to {MAX_IMPORT_BATCH_SIZE}."})
+
+        importer = UserImporter(
+            batch_size=batch_size,
+            activate=request.query_params.get('activate', '').lower() in ('1', 'true', 'yes'),
+            domain=get_current_site(request).domain,
+            hasher_pool=import_hasher_pool(),
+        )
+        report = importer.run(read_rows(stream, import_type))
+        return Response(report, status=status.HTTP_200_OK)
+
+
+
+PHONE_SEARCH = re.compile(r'\+?[\d\s-]+')
+MIN_SEARCH_LENGTH = 3
+
+
+def search_users(queryset, term):
+    """
+    Narrows ``queryset`` to users matching ``term``, using only indexed
+    lookups (see User.Meta.indexes): a full email address is tried as an
+    exact case-insensitive match first; phone-like terms search the phone
+    column; anything else is a substring match on email or full name,
+    served by the trigram indexes.
+    """
+    if '@' in term and ' ' not in term:
+        exact = queryset.filter(email__iexact=term)
+        if exact.exists():
+            return exact
+    if PHONE_SEARCH.fullmatch(term):
+        return queryset.filter(phone__contains=term)
+    return queryset.filter(Q(email__icontains=term) | Q(full_name__icontains=term))
+
+
+class UserDirectoryView(generics.ListAPIView):
+    """
+    Staff lookup of users. ``?q=`` searches email, full name and phone
+    (at least 3 characters); ``?user_type=`` and ``?is_active=`` filter.
+    Cursor paginated.
+    """
+
+    serializer_class = UserDirectorySerializer
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = UserDirectoryCursorPagination
+
+    def get_queryset(self):
+        
+        params = self.request.query_params
+        queryset = User.objects.only(*UserDirectorySerializer.Meta.fields)
+
+        if params.get('user_type'):
+            queryset = queryset.filter(user_type=params['user_type'].upper())
+        if params.get('is_active'):
+            queryset = queryset.filter(is_active=params['is_active'].lower() in ('1', 'true', 'yes'))
+
+        term = params.get('q', '').strip()
+        if term:
+            if len(term) < MIN_SEARCH_LENGTH:
+                raise ValidationError({"q": f"Search for at least {MIN_SEARCH_LENGTH} characters."})
+            queryset = search_users(queryset, term)
+        return queryset
+
+
+
+class AccountMetricsView(APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+
+        return Response({
+            "auth_token_cache": token_cache.stats(),
+            "password_hashing": password_hasher_pool.stats(),
+        }, status=status.HTTP_200_OK)
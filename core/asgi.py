@@ -3,6 +3,10 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Long-lived payment status streams (/api/payments/stream/) are async views and
+should be served through this application (e.g. ``uvicorn core.asgi:application``)
+so an open stream costs an idle coroutine rather than a worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
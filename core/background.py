@@ -0,0 +1,71 @@
+import threading, traceback
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_WORKERS', 8),
+                    thread_name_prefix='background',
+                )
+    return _executor
+
+
+def _run(fn, args, kwargs):
+    
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        print(f"⚠️ Background task {fn.__name__} failed:")
+        traceback.print_exc()
+        raise
+    finally:
+        close_old_connections()
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Runs ``fn`` on the shared in-process worker pool. Each task gets fresh
+    DB connections so it never reuses the request thread's connection.
+    """
+    return get_executor().submit(_run, fn, args, kwargs)
+
+
+_timers = {}
+
+
+def submit_at(name, when, fn, *args, **kwargs):
+    """
+    Submits ``fn`` to the pool at ``when`` (an aware datetime). One timer
+    per ``name``: an earlier request replaces a later one, a later one is
+    dropped, so retry loops never pile up timers.
+    """
+    with _lock:
+        current = _timers.get(name)
+        if current is not None and current[0] <= when and current[1].is_alive():
+            return
+        if current is not None:
+            current[1].cancel()
+
+        def fire():
+            with _lock:
+                if _timers.get(name, (None, None))[1] is timer:
+                    del _timers[name]
+            submit(fn, *args, **kwargs)
+
+        timer = threading.Timer(max((when - timezone.now()).total_seconds(), 0), fire)
+        timer.daemon = True
+        _timers[name] = (when, timer)
+        timer.start()
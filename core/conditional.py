@@ -0,0 +1,39 @@
+import hashlib
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(request, *versions):
+    """
+    Strong ETag for a representation identified by ``versions`` (e.g. a row's
+    updated_at), scoped to the URL, host and negotiated format so different
+    renderings of the same version never share a tag.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    parts = [request.get_host(), request.get_full_path(), getattr(renderer, 'format', '')] + [str(v) for v in versions]
+    return '"' + hashlib.sha256('|'.join(parts).encode()).hexdigest()[:32] + '"'
+
+
+def is_not_modified(request, etag):
+
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    # If-None-Match uses weak comparison: W/"x" matches "x".
+    return '*' in tags or etag in tags or etag in (tag.removeprefix('W/') for tag in tags)
+
+
+def with_etag(response, etag):
+
+    response['ETag'] = etag
+    # Per-user data: never shared by proxies, always revalidated by clients.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified(etag):
+
+    return with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
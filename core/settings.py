@@ -30,11 +30,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
-    'django_user_agents',
 
     'accounts',
     'devices',
@@ -44,7 +44,6 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
-    'django_user_agents.middleware.UserAgentMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -116,6 +115,14 @@ DATABASES = {
 # }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -165,13 +172,41 @@ AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ]
 }
 
+#API token -> user cache used by CachedTokenAuthentication (seconds / entries). The shared layer
+# needs a cache all workers see (CACHE_BACKEND=Redis/Memcached); with LocMemCache only the
+# short per-process layer is used, so revocations reach every worker within AUTH_TOKEN_LOCAL_TTL.
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 300))
+AUTH_TOKEN_LOCAL_TTL = int(os.getenv('AUTH_TOKEN_LOCAL_TTL', 5))
+AUTH_TOKEN_LOCAL_SIZE = int(os.getenv('AUTH_TOKEN_LOCAL_SIZE', 10000))
+
+#API tokens expire AUTH_TOKEN_TTL seconds after their last use (0 = never); last use is
+# written at most once per AUTH_TOKEN_TOUCH_INTERVAL. Run `manage.py purge_tokens` daily.
+AUTH_TOKEN_TTL = int(os.getenv('AUTH_TOKEN_TTL', 30 * 24 * 3600))
+AUTH_TOKEN_TOUCH_INTERVAL = int(os.getenv('AUTH_TOKEN_TOUCH_INTERVAL', 3600))
+
+#User-agent parsing (device auto-detect): per-process LRU size, and an optional cache
+# alias from CACHES shared by all processes (empty = local LRU only).
+USER_AGENT_LOCAL_SIZE = int(os.getenv('USER_AGENT_LOCAL_SIZE', 1024))
+USER_AGENT_CACHE = os.getenv('USER_AGENT_CACHE', '') or None
+USER_AGENT_CACHE_TTL = int(os.getenv('USER_AGENT_CACHE_TTL', 24 * 3600))
+
+#Password hashing pool: PBKDF2 runs in these worker processes (0 = hash in-process).
+# At most PASSWORD_HASH_MAX_CONCURRENCY hashes are admitted at once; callers waiting
+# longer than PASSWORD_HASH_QUEUE_TIMEOUT seconds get a 503.
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_MAX_CONCURRENCY = int(os.getenv('PASSWORD_HASH_MAX_CONCURRENCY', 8))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', 5))
+# Imports through /api/accounts/users/import/ hash on their own pool of this many processes
+# (0 = in the request thread), never on the login pool above.
+USER_IMPORT_HASH_WORKERS = int(os.getenv('USER_IMPORT_HASH_WORKERS', 1))
+
 
 
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
@@ -182,14 +217,45 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
+#Email outbox: emails are queued in the DB and sent in batches over one SMTP connection.
+# Set EMAIL_OUTBOX_AUTO_SEND to False when `manage.py send_outbox_emails --loop` runs as its own worker.
+EMAIL_OUTBOX_AUTO_SEND = os.getenv('EMAIL_OUTBOX_AUTO_SEND', 'True') == 'True'
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 100))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+EMAIL_OUTBOX_RETRY_BACKOFF = int(os.getenv('EMAIL_OUTBOX_RETRY_BACKOFF', 30))
+EMAIL_OUTBOX_RETRY_MAX_DELAY = int(os.getenv('EMAIL_OUTBOX_RETRY_MAX_DELAY', 3600))
+# Seconds a claimed batch is hidden from other senders; longer than the slowest batch takes to send.
+EMAIL_OUTBOX_CLAIM_TIMEOUT = int(os.getenv('EMAIL_OUTBOX_CLAIM_TIMEOUT', 600))
+
 
 STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Write uploads straight to a temporary file instead of buffering them in memory;
+# the storage then moves the file into MEDIA_ROOT without copying.
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+
+#Profile image variants, rendered on the background pool (accounts.images):
+# name -> (max size in px, crop to a square), each stored as WebP and JPEG.
+PROFILE_IMAGE_VARIANTS = {
+    'thumb': (int(os.getenv('PROFILE_IMAGE_THUMB_SIZE', 128)), True),
+    'medium': (int(os.getenv('PROFILE_IMAGE_MEDIUM_SIZE', 512)), False),
+}
+PROFILE_IMAGE_QUALITY = int(os.getenv('PROFILE_IMAGE_QUALITY', 82))
+
 STAFF_SECURITY_CODE = os.getenv('STAFF_SECURITY_CODE', 'rajib3777')
 
 PAYMENT_WEBHOOK_SECRET = os.getenv('PAYMENT_WEBHOOK_SECRET', 'rajib3777')
+PAYMENT_WEBHOOK_BATCH_SIZE = int(os.getenv('PAYMENT_WEBHOOK_BATCH_SIZE', 500))
+# Drain the webhook inbox on the in-process background pool after each delivery.
+# Set to False when `manage.py process_webhook_inbox --loop` runs as its own worker.
+PAYMENT_WEBHOOK_AUTO_DRAIN = os.getenv('PAYMENT_WEBHOOK_AUTO_DRAIN', 'True') == 'True'
+# Webhooks that arrive before their payment can be matched (e.g. before gateway_reference
+# is saved) are retried with exponential backoff, then dropped after the max age (seconds).
+PAYMENT_WEBHOOK_RETRY_BACKOFF = int(os.getenv('PAYMENT_WEBHOOK_RETRY_BACKOFF', 2))
+PAYMENT_WEBHOOK_RETRY_MAX_DELAY = int(os.getenv('PAYMENT_WEBHOOK_RETRY_MAX_DELAY', 300))
+PAYMENT_WEBHOOK_UNMATCHED_MAX_AGE = int(os.getenv('PAYMENT_WEBHOOK_UNMATCHED_MAX_AGE', 3600))
 
 
 SITE_URL = os.getenv('SITE_URL', 'http://127.0.0.1:8000')
@@ -201,8 +267,55 @@ BKASH_APP_KEY = os.getenv('BKASH_APP_KEY')
 BKASH_APP_SECRET = os.getenv('BKASH_APP_SECRET')
 BKASH_USERNAME = os.getenv('BKASH_USERNAME')
 BKASH_PASSWORD = os.getenv('BKASH_PASSWORD')
+BKASH_TOKEN_REFRESH_MARGIN = int(os.getenv('BKASH_TOKEN_REFRESH_MARGIN', 300))
 
 #Nagad
 NAGAD_BASE_URL = os.getenv('NAGAD_BASE_URL', 'https://sandbox.mynagad.com')
 NAGAD_MERCHANT_ID = os.getenv('NAGAD_APP_MERCHANTID')
 
+#Async payment initiation: answer 202 and call the gateway on the background pool
+PAYMENT_ASYNC_DISPATCH = os.getenv('PAYMENT_ASYNC_DISPATCH', 'False') == 'True'
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 8))
+
+#Payment status streams (SSE / long-poll). 'local' delivers changes made in this
+#process only; 'cache' also relays them through the shared cache for multi-process setups.
+PAYMENT_STATUS_HUB_BACKEND = os.getenv('PAYMENT_STATUS_HUB_BACKEND', 'local')
+PAYMENT_STATUS_STREAM_HEARTBEAT = int(os.getenv('PAYMENT_STATUS_STREAM_HEARTBEAT', 15))
+PAYMENT_STATUS_STREAM_MAX_AGE = int(os.getenv('PAYMENT_STATUS_STREAM_MAX_AGE', 300))
+
+#PaymentStatusView cache (seconds): open states, final states, unknown transaction IDs
+PAYMENT_STATUS_CACHE_TTL = int(os.getenv('PAYMENT_STATUS_CACHE_TTL', 3))
+PAYMENT_STATUS_CACHE_FINAL_TTL = int(os.getenv('PAYMENT_STATUS_CACHE_FINAL_TTL', 3600))
+PAYMENT_STATUS_CACHE_NEGATIVE_TTL = int(os.getenv('PAYMENT_STATUS_CACHE_NEGATIVE_TTL', 2))
+
+#Idempotency-Key handling on payment creation (seconds)
+PAYMENT_IDEMPOTENCY_TTL = int(os.getenv('PAYMENT_IDEMPOTENCY_TTL', 24 * 3600))
+PAYMENT_IDEMPOTENCY_WAIT = int(os.getenv('PAYMENT_IDEMPOTENCY_WAIT', 10))
+
+#Reconciliation of PROCESSING payments whose webhook never arrived
+PAYMENT_RECONCILE_AFTER = int(os.getenv('PAYMENT_RECONCILE_AFTER', 900))
+PAYMENT_RECONCILE_CHUNK_SIZE = int(os.getenv('PAYMENT_RECONCILE_CHUNK_SIZE', 500))
+PAYMENT_RECONCILE_CONCURRENCY = int(os.getenv('PAYMENT_RECONCILE_CONCURRENCY', 16))
+# Queued async payments left PENDING this long (a dispatch lost to a restart) are dispatched
+# again; once older than PAYMENT_DISPATCH_MAX_AGE they are marked FAILED instead.
+PAYMENT_DISPATCH_STALE_AFTER = int(os.getenv('PAYMENT_DISPATCH_STALE_AFTER', 120))
+PAYMENT_DISPATCH_MAX_AGE = int(os.getenv('PAYMENT_DISPATCH_MAX_AGE', 3600))
+PAYMENT_GATEWAY_RATE_LIMITS = {
+    'BKASH': float(os.getenv('BKASH_RATE_LIMIT', 20)),
+    'NAGAD': float(os.getenv('NAGAD_RATE_LIMIT', 10)),
+}
+
+#Gateway HTTP client (connection pool per host, (connect, read) timeouts per gateway)
+PAYMENT_HTTP_POOL_CONNECTIONS = int(os.getenv('PAYMENT_HTTP_POOL_CONNECTIONS', 10))
+PAYMENT_HTTP_POOL_MAXSIZE = int(os.getenv('PAYMENT_HTTP_POOL_MAXSIZE', 50))
+PAYMENT_GATEWAY_TIMEOUTS = {
+    'BKASH': (
+        float(os.getenv('BKASH_CONNECT_TIMEOUT', 3.05)),
+        float(os.getenv('BKASH_READ_TIMEOUT', 15)),
+    ),
+    'NAGAD': (
+        float(os.getenv('NAGAD_CONNECT_TIMEOUT', 3.05)),
+        float(os.getenv('NAGAD_READ_TIMEOUT', 15)),
+    ),
+}
+
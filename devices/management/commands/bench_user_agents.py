@@ -0,0 +1,123 @@
+import random, re, time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from devices import user_agents
+
+# A mix of current mobile, tablet, desktop and bot user agents.
+CORPUS = [
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 16_6_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.6 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.6422.165 Mobile Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 13; SM-A536E) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.6367.179 Mobile Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 12; Redmi Note 11) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.6312.118 Mobile Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.6422.113 Mobile Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 11; vivo 1906) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.6261.119 Mobile Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 13; CPH2487) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36 OPR/82.0.2254.72",
+    "Mozilla/5.0 (Linux; U; Android 12; en-US; RMX3511 Build/SP1A.210812.016) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/100.0.4896.58 UCBrowser/13.4.0.1306 Mobile Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 13; SAMSUNG SM-A546E) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/25.0 Chrome/121.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (iPad; CPU OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 13; SM-X200) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.6367.159 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.2478.80",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:126.0) Gecko/20100101 Firefox/126.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4.1 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (Windows NT 6.1; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36",
+    "Dalvik/2.1.0 (Linux; U; Android 13; SM-A145F Build/TP1A.220624.014)",
+    "okhttp/4.12.0",
+    "PostmanRuntime/7.39.0",
+    "python-requests/2.32.3",
+    "curl/8.7.1",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)",
+    "facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)",
+    "Mozilla/5.0 (Linux; Android 14; 23078RKD5C Build/UP1A.230905.011; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/125.0.6422.146 Mobile Safari/537.36",
+]
+
+
+def user_agent_variants(count):
+    """
+    ``count`` distinct UA strings: the corpus with its last version number
+    bumped, the long tail of patch releases seen in real traffic.
+    """
+    variants = []
+    for i in range(count):
+        base, bump = CORPUS[i % len(CORPUS)], i // len(CORPUS)
+        variants.append(re.sub(r'(\d+)(?!.*\d)', lambda m: str(int(m.group(1)) + bump), base, count=1))
+    return variants
+
+
+def request_stream(count, distinct, seed=1):
+    """``count`` lookups drawn Zipf-like from ``distinct`` UAs: a few clients dominate, like real traffic."""
+    variants = user_agent_variants(distinct)
+    weights = [1 / rank for rank in range(1, len(variants) + 1)]
+    return random.Random(seed).choices(variants, weights=weights, k=count)
+
+
+def timed(fn, stream):
+
+    samples = []
+    for ua_string in stream:
+        started = time.perf_counter()
+        fn(ua_string)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "avg_us": sum(samples) / len(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1e6,
+    }
+
+
+class Command(BaseCommand):
+
+    help = "Compare the cost of parsing user agents uncached, via the shared cache and via the local LRU."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--distinct', type=int, default=2000, help="Distinct user agents in the stream.")
+        parser.add_argument(
+            '--cache', default=None,
+            help="Cache alias for the shared-cache run. Default: a throwaway in-memory cache; "
+                 "name a Redis/Memcached alias to include the network round trip.",
+        )
+
+    def handle(self, *args, **options):
+
+        stream = request_stream(options['requests'], options['distinct'])
+        results = {}
+
+        # What parsing on every request costs (ua-parser's own small cache included).
+        results['uncached'] = timed(user_agents.parse_device, stream)
+
+        # Shared cache only (another process warmed it; this one's LRU is cold).
+        bench_caches = {**settings.CACHES, 'ua-bench': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ua-bench',
+            'OPTIONS': {'MAX_ENTRIES': len(stream) + 1},
+        }}
+        with override_settings(CACHES=bench_caches, USER_AGENT_CACHE=options['cache'] or 'ua-bench'):
+            for ua_string in set(stream):
+                user_agents._parse_shared(ua_string)
+            results['shared cache'] = timed(user_agents._parse_shared, stream)
+
+        # Local LRU, from cold: includes one parse per distinct UA.
+        user_agents._parse_local.cache_clear()
+        with override_settings(USER_AGENT_CACHE=None):
+            results['local LRU'] = timed(user_agents.device_info, stream)
+        lru = user_agents.stats()
+
+        baseline = results['uncached']['avg_us']
+        self.stdout.write(
+            f"{len(stream)} lookups over {len(set(stream))} distinct user agents; "
+            f"local LRU hit ratio {lru['hit_ratio']} with {lru['size']} entries"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:>13}: avg={result['avg_us']:8.1f}us p50={result['p50_us']:8.1f}us "
+                f"p99={result['p99_us']:8.1f}us  x{baseline / result['avg_us']:.0f}"
+            )
@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Device
+
+
+def bump_devices_version(user_id):
+    """Invalidates the user's device list ETag."""
+    get_user_model().objects.filter(pk=user_id).update(devices_version=F('devices_version') + 1)
+
+
+@receiver(post_save, sender=Device)
+def device_saved(sender, instance, **kwargs):
+
+    bump_devices_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Device)
+def device_deleted(sender, instance, **kwargs):
+
+    bump_devices_version(instance.user_id)
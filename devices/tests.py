@@ -1,3 +1,49 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
+from accounts.models import User
+from .models import Device
 
-# Create your tests here.
+
+class DeviceListETagTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='devices@example.com', password=None, username='devices', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unchanged_list_answers_304(self):
+        Device.objects.create(user=self.user, device_name='Phone')
+        etag = self.client.get('/api/devices/list/')['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/devices/list/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_adding_or_deleting_a_device_changes_the_etag(self):
+        etag = self.client.get('/api/devices/list/')['ETag']
+
+        device = Device.objects.create(user=self.user, device_name='Phone')
+        added = self.client.get('/api/devices/list/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(added.status_code, 200)
+
+        device.delete()
+        deleted = self.client.get('/api/devices/list/', HTTP_IF_NONE_MATCH=added['ETag'])
+        self.assertEqual(deleted.status_code, 200)
+        self.assertNotIn(deleted['ETag'], (etag, added['ETag']))
+
+    def test_other_users_devices_do_not_change_the_etag(self):
+        etag = self.client.get('/api/devices/list/')['ETag']
+        other = User.objects.create_user(email='other@example.com', password=None, username='other', is_active=True)
+
+        Device.objects.create(user=other, device_name='Tablet')
+
+        self.assertEqual(self.client.get('/api/devices/list/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class DeviceMetricsTests(TestCase):
+
+    def test_metrics_report_the_user_agent_cache(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='ops@example.com', password=None, username='ops', is_staff=True, is_active=True))
+
+        self.assertIn('user_agent_cache', client.get('/api/devices/metrics/').json())
@@ -3,6 +3,7 @@ from .views import (DeviceCreateView,
     DeviceAutoDetectView,
     DeviceListView,
     DeviceDeleteView,
+    DeviceMetricsView,
 )
 
 urlpatterns = [
@@ -14,4 +15,6 @@ urlpatterns = [
     path('list/', DeviceListView.as_view(), name='device-list'),
 
     path('delete/<int:pk>/', DeviceDeleteView.as_view(), name='device-delete'),
+
+    path('metrics/', DeviceMetricsView.as_view(), name='device-metrics'),
 ]
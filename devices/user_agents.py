@@ -0,0 +1,82 @@
+"""
+User-agent parsing for the device endpoints.
+
+Parsing a UA string runs a long list of regexes, so it is done only where a
+view asks for it (not in middleware) and memoized by the UA string: first
+in a bounded per-process LRU (USER_AGENT_LOCAL_SIZE entries), then, if
+USER_AGENT_CACHE names a Django cache alias, in that shared cache. Only the
+small DeviceInfo summary is cached, never the parser objects.
+"""
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import caches
+from user_agents import parse
+
+USER_AGENT_CACHE_KEY = 'devices:ua:{}'
+# Longer strings are truncated before parsing and caching; real UAs are far shorter.
+MAX_USER_AGENT_LENGTH = 512
+
+DeviceInfo = namedtuple('DeviceInfo', ['device_type', 'device_name', 'os_version'])
+
+
+def parse_device(ua_string):
+    """Uncached parse of a UA string into the fields a Device needs."""
+    user_agent = parse(ua_string)
+    device_type = (
+        "MOBILE" if user_agent.is_mobile else
+        "TABLET" if user_agent.is_tablet else
+        "DESKTOP"
+    )
+    return DeviceInfo(
+        device_type=device_type,
+        device_name=user_agent.device.family or "Unknown Device",
+        os_version=f"{user_agent.os.family} {user_agent.os.version_string}",
+    )
+
+
+def _shared_cache():
+
+    alias = getattr(settings, 'USER_AGENT_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def _parse_shared(ua_string):
+
+    shared = _shared_cache()
+    if shared is None:
+        return parse_device(ua_string)
+
+    key = USER_AGENT_CACHE_KEY.format(hashlib.sha1(ua_string.encode()).hexdigest())
+    cached = shared.get(key)
+    if cached is not None:
+        return DeviceInfo(*cached)
+    info = parse_device(ua_string)
+    shared.set(key, tuple(info), getattr(settings, 'USER_AGENT_CACHE_TTL', 24 * 3600))
+    return info
+
+
+_parse_local = lru_cache(maxsize=getattr(settings, 'USER_AGENT_LOCAL_SIZE', 1024))(_parse_shared)
+
+
+def device_info(ua_string):
+
+    return _parse_local((ua_string or '')[:MAX_USER_AGENT_LENGTH])
+
+
+def request_device_info(request):
+
+    return device_info(request.headers.get('User-Agent', ''))
+
+
+def stats():
+
+    info = _parse_local.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "hit_ratio": round(info.hits / lookups, 4) if lookups else None,
+    }
@@ -1,8 +1,11 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from django_user_agents.utils import get_user_agent
+from rest_framework.views import APIView
+from accounts.models import User
+from core.conditional import make_etag, is_not_modified, not_modified, with_etag
 from .models import Device
 from .serializers import DeviceSerializer
+from .user_agents import request_device_info, stats as user_agent_stats
 
 
 
@@ -32,22 +35,15 @@ class DeviceAutoDetectView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def create(self, request, *args, **kwargs):
-        user_agent = get_user_agent(request)
-        device_type = (
-            "MOBILE" if user_agent.is_mobile else
-            "TABLET" if user_agent.is_tablet else
-            "DESKTOP"
-        )
-
-        os_version = f"{user_agent.os.family} {user_agent.os.version_string}"
-        device_name = user_agent.device.family or "Unknown Device"
+        # Parsed here rather than in middleware; memoized by UA string.
+        info = request_device_info(request)
 
 
         device = Device.objects.create(
             user=request.user,
-            device_name=device_name,
-            device_type=device_type,
-            os_version=os_version
+            device_name=info.device_name,
+            device_type=info.device_type,
+            os_version=info.os_version
         )
 
 
@@ -67,6 +63,15 @@ class DeviceListView(generics.ListAPIView):
 
     def get_queryset(self):
         return Device.objects.filter(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        # One primary-key read decides; the devices are only loaded and
+        # serialized when the client's copy is out of date.
+        version = User.objects.filter(pk=request.user.pk).values_list('devices_version', flat=True).first()
+        etag = make_etag(request, request.user.pk, version)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        return with_etag(super().list(request, *args, **kwargs), etag)
     
 
 
@@ -87,3 +92,15 @@ class DeviceDeleteView(generics.DestroyAPIView):
         
         return Response({"message": "Device deleted successfully."}, status=status.HTTP_200_OK)
     
+
+
+
+class DeviceMetricsView(APIView):
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+
+        return Response({
+            "user_agent_cache": user_agent_stats(),
+        }, status=status.HTTP_200_OK)
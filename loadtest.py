@@ -0,0 +1,194 @@
+"""
+End-to-end load driver: register -> activate -> login -> pay -> webhook -> status.
+
+Run Django and the gateway simulator (mock_bkash.py) first, then e.g.
+
+    python loadtest.py --base http://127.0.0.1:8000 --rps 20 --duration 60
+
+Flows are started open-loop at the target rate (a slow server does not
+slow the arrival rate down) on a bounded thread pool. Each step's latency
+is recorded, plus "settle": the time from the create call until the status
+endpoint reports the final status delivered by the simulator's webhook.
+At the end p50/p90/p95/p99/max per step and the error counts are printed.
+"""
+import argparse, itertools, json, random, threading, time, uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+FINAL_STATUSES = ('SUCCESS', 'FAILED', 'CANCELED')
+STEPS = ('register', 'activate', 'login', 'pay', 'status', 'settle')
+
+
+class Recorder:
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.flows = 0
+        self.completed = 0
+        self.lag = []
+        self.start_window = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, step, seconds):
+        with self.lock:
+            self.latencies[step].append(seconds)
+
+    def error(self, step, reason):
+        with self.lock:
+            self.errors[f"{step}: {reason}"] += 1
+
+
+def percentile(values, pct):
+    # nearest-rank
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+class Flow:
+
+    def __init__(self, args, recorder):
+        self.args = args
+        self.recorder = recorder
+        self.session = requests.Session()
+
+    def call(self, step, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            res = self.session.request(method, self.args.base + path, timeout=self.args.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.error(step, type(e).__name__)
+            return None
+        self.recorder.record(step, time.perf_counter() - started)
+        if res.status_code >= 400:
+            self.recorder.error(step, f"HTTP {res.status_code}")
+            return None
+        return res
+
+    def run(self):
+        email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+        password = "LoadTest!" + uuid.uuid4().hex[:8]
+
+        res = self.call('register', 'POST', '/api/accounts/register/', json={
+            "email": email, "username": email.split('@')[0], "full_name": "Load Test", "password": password,
+        })
+        if res is None:
+            return False
+        # The link is built from the Sites domain; replay only its path against --base.
+        if self.call('activate', 'GET', urlparse(res.json()['activation_link']).path) is None:
+            return False
+
+        res = self.call('login', 'POST', '/api/accounts/login/', json={"email": email, "password": password})
+        if res is None:
+            return False
+        self.session.headers['Authorization'] = f"Token {res.json()['token']}"
+
+        for _ in range(self.args.payments):
+            if not self.pay():
+                return False
+        return True
+
+    def pay(self):
+        method = random.choice(self.args.methods)
+        created = time.perf_counter()
+        res = self.call('pay', 'POST', '/api/payments/create/', json={"payment_method": method, "amount": "100.00"})
+        if res is None:
+            return False
+        txid = res.json().get('transaction_id')
+
+        deadline = created + self.args.settle_timeout
+        while time.perf_counter() < deadline:
+            res = self.call('status', 'GET', '/api/payments/status/', params={"transaction_id": txid})
+            if res is not None and res.json().get('status') in FINAL_STATUSES:
+                self.recorder.record('settle', time.perf_counter() - created)
+                return True
+            time.sleep(self.args.poll_interval)
+        self.recorder.error('settle', "timed out waiting for the webhook")
+        return False
+
+
+def run(args):
+    recorder = Recorder()
+    interval = 1 / args.rps
+    started = time.perf_counter()
+
+    def flow(scheduled_at):
+        recorder.lag.append(time.perf_counter() - scheduled_at)
+        ok = Flow(args, recorder).run()
+        with recorder.lock:
+            recorder.completed += ok
+
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='load') as pool:
+        for n in itertools.count():
+            scheduled_at = started + n * interval
+            if scheduled_at - started >= args.duration:
+                break
+            time.sleep(max(scheduled_at - time.perf_counter(), 0))
+            recorder.flows += 1
+            pool.submit(flow, scheduled_at)
+        recorder.start_window = time.perf_counter() - started
+
+    return recorder, time.perf_counter() - started
+
+
+def report(recorder, elapsed, as_json=False):
+    summary = {
+        "flows": recorder.flows,
+        "completed": recorder.completed,
+        "elapsed_seconds": round(elapsed, 2),
+        "flows_per_second": round(recorder.flows / recorder.start_window, 2) if recorder.start_window else 0.0,
+        "start_lag_p99_ms": round(percentile(recorder.lag, 99) * 1000, 1),
+        "steps": {},
+        "errors": dict(recorder.errors),
+    }
+    for step in STEPS:
+        values = recorder.latencies.get(step, [])
+        summary["steps"][step] = {
+            "count": len(values),
+            **{f"p{pct}_ms": round(percentile(values, pct) * 1000, 1) for pct in (50, 90, 95, 99)},
+            "max_ms": round(max(values, default=0) * 1000, 1),
+        }
+
+    if as_json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"\nflows: {summary['flows']} started, {summary['completed']} completed in "
+          f"{summary['elapsed_seconds']}s ({summary['flows_per_second']}/s, start lag p99 {summary['start_lag_p99_ms']} ms)\n")
+    print(f"{'step':<10}{'count':>8}{'p50':>10}{'p90':>10}{'p95':>10}{'p99':>10}{'max':>10}   (ms)")
+    for step, row in summary["steps"].items():
+        print(f"{step:<10}{row['count']:>8}{row['p50_ms']:>10}{row['p90_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+    if summary["errors"]:
+        print("\nerrors:")
+        for reason, count in sorted(summary["errors"].items(), key=lambda item: -item[1]):
+            print(f"  {count:>6}  {reason}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base', default='http://127.0.0.1:8000', help="Django base URL.")
+    parser.add_argument('--rps', type=float, default=5, help="New user flows started per second.")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to keep starting flows.")
+    parser.add_argument('--concurrency', type=int, default=64, help="Flows in flight at most.")
+    parser.add_argument('--payments', type=int, default=1, help="Payments per user flow.")
+    parser.add_argument('--methods', default='BKASH,NAGAD', help="Comma-separated payment methods to pick from.")
+    parser.add_argument('--timeout', type=float, default=30, help="Per-request timeout in seconds.")
+    parser.add_argument('--settle-timeout', type=float, default=30, help="Seconds to wait for the webhook to settle a payment.")
+    parser.add_argument('--poll-interval', type=float, default=0.25, help="Seconds between status polls.")
+    parser.add_argument('--json', action='store_true', help="Print the summary as JSON.")
+    args = parser.parse_args()
+    args.base = args.base.rstrip('/')
+    args.methods = [method.strip().upper() for method in args.methods.split(',') if method.strip()]
+
+    recorder, elapsed = run(args)
+    report(recorder, elapsed, as_json=args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,225 @@
+"""
+Local gateway simulator for bKash (grant / refresh / create / execute /
+status) and Nagad (initialize / verify).
+
+Everything is configured through environment variables so the same file
+works for manual testing and for load tests (see loadtest.py):
+
+    MOCK_PORT                  port to listen on (9000)
+    MOCK_LATENCY               latency distribution in ms, e.g. "fixed:0",
+                               "uniform:20,80", "normal:60,15",
+                               "lognormal:60,0.5" or "exponential:60"
+    MOCK_ERROR_RATE            share of gateway calls answered with HTTP 500
+    MOCK_TIMEOUT_RATE          share of gateway calls that hang for
+                               MOCK_TIMEOUT_SECONDS and then answer 504
+    MOCK_TIMEOUT_SECONDS       how long a "timed out" call hangs (30)
+    MOCK_MAX_PAYMENTS          payments kept in memory; oldest are evicted (100000)
+    MOCK_AUTO_WEBHOOK          post a callback for every created payment (True)
+    MOCK_WEBHOOK_SITE          Django base URL the callbacks go to
+                               (SITE_URL or http://127.0.0.1:8000)
+    MOCK_WEBHOOK_DELAY         callback delay distribution in ms ("uniform:200,1000")
+    MOCK_WEBHOOK_SUCCESS_RATE  share of callbacks reporting success (0.95)
+    MOCK_WEBHOOK_WORKERS       threads posting callbacks (8)
+    MOCK_WEBHOOK_MAX_PENDING   callbacks queued at most; extra ones are dropped (10000)
+    PAYMENT_WEBHOOK_SECRET     when set, callbacks carry an X-Signature HMAC
+
+Point Django at it with:
+
+    BKASH_BASE_URL=http://127.0.0.1:9000/v1.2.0-beta
+    NAGAD_BASE_URL=http://127.0.0.1:9000
+"""
 from flask import Flask, request, jsonify
-import uuid, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib, heapq, hmac, json, os, random, threading, time, uuid
+
+import requests
 
 app = Flask(__name__)
 
-# Simple in-memory store to hold created payments
-PAYMENTS = {}
+
+def parse_distribution(spec):
+    """Turns "name:a,b" into a function returning a sample in seconds."""
+    name, _, args = (spec or "fixed:0").partition(":")
+    params = [float(value) for value in args.split(",") if value.strip()] or [0.0]
+    if name == "fixed":
+        sample = lambda: params[0]
+    elif name == "uniform":
+        low, high = params[0], params[1] if len(params) > 1 else params[0]
+        sample = lambda: random.uniform(low, high)
+    elif name == "normal":
+        mean, sigma = params[0], params[1] if len(params) > 1 else 0.0
+        sample = lambda: random.gauss(mean, sigma)
+    elif name == "lognormal":
+        # median in ms, shape sigma
+        median, sigma = params[0], params[1] if len(params) > 1 else 0.5
+        sample = lambda: median * random.lognormvariate(0, sigma)
+    elif name == "exponential":
+        sample = lambda: random.expovariate(1 / params[0]) if params[0] else 0.0
+    else:
+        raise ValueError(f"Unknown distribution: {spec}")
+    return lambda: max(sample(), 0.0) / 1000
+
+
+LATENCY = parse_distribution(os.getenv("MOCK_LATENCY", "fixed:0"))
+ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", 0))
+TIMEOUT_RATE = float(os.getenv("MOCK_TIMEOUT_RATE", 0))
+TIMEOUT_SECONDS = float(os.getenv("MOCK_TIMEOUT_SECONDS", 30))
+MAX_PAYMENTS = int(os.getenv("MOCK_MAX_PAYMENTS", 100000))
+
+AUTO_WEBHOOK = os.getenv("MOCK_AUTO_WEBHOOK", "True") == "True"
+WEBHOOK_SITE = os.getenv("MOCK_WEBHOOK_SITE", os.getenv("SITE_URL", "http://127.0.0.1:8000"))
+WEBHOOK_DELAY = parse_distribution(os.getenv("MOCK_WEBHOOK_DELAY", "uniform:200,1000"))
+WEBHOOK_SUCCESS_RATE = float(os.getenv("MOCK_WEBHOOK_SUCCESS_RATE", 0.95))
+WEBHOOK_WORKERS = int(os.getenv("MOCK_WEBHOOK_WORKERS", 8))
+WEBHOOK_MAX_PENDING = int(os.getenv("MOCK_WEBHOOK_MAX_PENDING", 10000))
+WEBHOOK_SECRET = os.getenv("PAYMENT_WEBHOOK_SECRET")
+
+
+class PaymentStore:
+    """Thread-safe, size-bounded payment store; the oldest entries are evicted first."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def add(self, payment_id, payment):
+        with self.lock:
+            self.items[payment_id] = payment
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+                self.evicted += 1
+
+    def get(self, payment_id):
+        with self.lock:
+            payment = self.items.get(payment_id)
+            return dict(payment) if payment else None
+
+    def update(self, payment_id, **fields):
+        with self.lock:
+            if payment_id not in self.items:
+                return False
+            self.items[payment_id].update(fields)
+            return True
+
+    def __len__(self):
+        return len(self.items)
+
+
+PAYMENTS = PaymentStore(MAX_PAYMENTS)
+
+
+class WebhookScheduler:
+    """
+    Posts delayed gateway callbacks. A single timer thread keeps a heap of
+    due times and hands due callbacks to a small pool, so a slow Django
+    never blocks the gateway endpoints. The queue is bounded; callbacks
+    beyond WEBHOOK_MAX_PENDING are dropped and counted.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.max_pending = max_pending
+        self.heap = []
+        self.cond = threading.Condition()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mock-webhook")
+        self.session = requests.Session()
+        self.stats = {"scheduled": 0, "sent": 0, "failed": 0, "dropped": 0}
+        threading.Thread(target=self._run, name="mock-webhook-timer", daemon=True).start()
+
+    def schedule(self, delay, payment_id):
+        with self.cond:
+            if len(self.heap) >= self.max_pending:
+                self.stats["dropped"] += 1
+                return False
+            heapq.heappush(self.heap, (time.monotonic() + delay, payment_id))
+            self.stats["scheduled"] += 1
+            self.cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.heap or self.heap[0][0] > time.monotonic():
+                    self.cond.wait(timeout=self.heap[0][0] - time.monotonic() if self.heap else None)
+                _, payment_id = heapq.heappop(self.heap)
+            self.pool.submit(self.send, payment_id)
+
+    def send(self, payment_id, status=None, site=None):
+        payment = PAYMENTS.get(payment_id)
+        if payment is None:
+            return None
+        success = status == "SUCCESS" if status else random.random() < WEBHOOK_SUCCESS_RATE
+        final_status = "SUCCESS" if success else "FAILED"
+        PAYMENTS.update(payment_id, status=final_status)
+
+        if payment["gateway"] == "NAGAD":
+            payload = {"payment_ref_id": payment_id, "status": "Success" if success else "Failed"}
+        else:
+            payload = {"paymentID": payment_id, "status": final_status, "transaction_id": payment.get("transaction_id") or ""}
+
+        body = json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json"}
+        if WEBHOOK_SECRET:
+            headers["X-Signature"] = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+        webhook_url = f"{site or WEBHOOK_SITE}/api/payments/webhook/"
+        try:
+            r = self.session.post(webhook_url, data=body, headers=headers, timeout=10)
+            self.stats["sent" if r.status_code < 400 else "failed"] += 1
+            return r
+        except requests.RequestException:
+            self.stats["failed"] += 1
+            raise
+
+    def pending(self):
+        with self.cond:
+            return len(self.heap)
+
+
+webhooks = WebhookScheduler(WEBHOOK_WORKERS, WEBHOOK_MAX_PENDING)
+STATS = {"requests": 0, "errors": 0, "timeouts": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        STATS[key] += 1
+
+
+@app.before_request
+def simulate_network():
+    # The /mock/ helpers are never delayed or failed.
+    if "/mock/" in request.path:
+        return None
+    _count("requests")
+    roll = random.random()
+    if roll < TIMEOUT_RATE:
+        _count("timeouts")
+        time.sleep(TIMEOUT_SECONDS)
+        return jsonify({"message": "Gateway timeout"}), 504
+    time.sleep(LATENCY())
+    if roll < TIMEOUT_RATE + ERROR_RATE:
+        _count("errors")
+        return jsonify({"message": "Internal server error (simulated)"}), 500
+    return None
+
+
+def _register_payment(gateway, payment_id, amount, **extra):
+    PAYMENTS.add(payment_id, {
+        "paymentID": payment_id,
+        "gateway": gateway,
+        "status": "INITIATED",
+        "amount": amount,
+        "created_at": int(time.time()),
+        **extra,
+    })
+    if AUTO_WEBHOOK:
+        webhooks.schedule(WEBHOOK_DELAY(), payment_id)
+
+
+# bKash
 
 @app.route("/v1.2.0-beta/tokenized/checkout/token/grant", methods=["POST"])
 def token_grant():
@@ -18,32 +233,34 @@ def token_grant():
     # Very permissive: if present, return fake token
     if username and password and app_key and app_secret:
         token = "MOCK_BKASH_TOKEN_" + uuid.uuid4().hex
-        resp = {"id_token": token, "token_type": "Bearer", "expires_in": "3600"}
+        refresh_token = "MOCK_BKASH_REFRESH_" + uuid.uuid4().hex
+        resp = {"id_token": token, "refresh_token": refresh_token, "token_type": "Bearer", "expires_in": "3600"}
         return jsonify(resp), 200
 
     return jsonify({"message": "Missing required request parameters: [password, username]"}), 400
 
 
+@app.route("/v1.2.0-beta/tokenized/checkout/token/refresh", methods=["POST"])
+def token_refresh():
+    body = request.get_json(silent=True) or {}
+    if not body.get("refresh_token", "").startswith("MOCK_BKASH_REFRESH_"):
+        return jsonify({"message": "Invalid refresh token"}), 400
+
+    token = "MOCK_BKASH_TOKEN_" + uuid.uuid4().hex
+    resp = {"id_token": token, "refresh_token": body["refresh_token"], "token_type": "Bearer", "expires_in": "3600"}
+    return jsonify(resp), 200
+
+
 @app.route("/v1.2.0-beta/tokenized/checkout/create", methods=["POST"])
 def create_payment():
     auth = request.headers.get("Authorization", "")
-    xapp = request.headers.get("X-APP-Key")
     if not auth.startswith("Bearer "):
         return jsonify({"message": "Unauthorized"}), 401
 
     payload = request.get_json(silent=True) or {}
-    amount = payload.get("amount")
     merchantInvoiceNumber = payload.get("merchantInvoiceNumber") or str(uuid.uuid4())[:10]
     payment_id = "MOCKPAY" + uuid.uuid4().hex[:16]
-
-    # store simulated payment
-    PAYMENTS[payment_id] = {
-        "paymentID": payment_id,
-        "status": "INITIATED",
-        "amount": amount,
-        "merchantInvoiceNumber": merchantInvoiceNumber,
-        "created_at": int(time.time())
-    }
+    _register_payment("BKASH", payment_id, payload.get("amount"), merchantInvoiceNumber=merchantInvoiceNumber)
 
     # typical bKash response contains paymentID and a redirect url (bkashURL)
     return jsonify({
@@ -56,35 +273,76 @@ def create_payment():
 @app.route("/v1.2.0-beta/tokenized/checkout/execute/<payment_id>", methods=["POST"])
 def execute(payment_id):
     # simulate the user completed the payment at bKash side
-    if payment_id not in PAYMENTS:
+    if not PAYMENTS.update(payment_id, status="SUCCESS"):
         return jsonify({"message": "Not found"}), 404
-    PAYMENTS[payment_id]["status"] = "SUCCESS"
     return jsonify({"paymentID": payment_id, "status": "SUCCESS"}), 200
 
 
-# Simulate webhook sender (for developer convenience)
+@app.route("/v1.2.0-beta/tokenized/checkout/payment/status", methods=["POST"])
+def payment_status():
+    payload = request.get_json(silent=True) or {}
+    payment = PAYMENTS.get(payload.get("paymentID"))
+    if payment is None:
+        return jsonify({"message": "Not found"}), 404
+    transaction_status = {"SUCCESS": "Completed", "FAILED": "Failed"}.get(payment["status"], "Initiated")
+    return jsonify({"paymentID": payment["paymentID"], "transactionStatus": transaction_status, "amount": payment["amount"]}), 200
+
+
+# Nagad
+
+@app.route("/remote-payment-gateway-1.0/api/dfs/check-out/initialize", methods=["POST"])
+def nagad_initialize():
+    payload = request.get_json(silent=True) or {}
+    if not payload.get("merchantId"):
+        return jsonify({"reason": "Invalid merchant"}), 400
+
+    payment_ref = "MOCKNGD" + uuid.uuid4().hex[:16]
+    _register_payment("NAGAD", payment_ref, payload.get("amount"), orderId=payload.get("orderId"))
+    return jsonify({
+        "paymentReferenceId": payment_ref,
+        "challenge": payload.get("challenge"),
+        "callBackUrl": f"https://mock.nagad.local/checkout/{payment_ref}",
+        "status": "Success"
+    }), 200
+
+
+@app.route("/remote-payment-gateway-1.0/api/dfs/verify/payment/<payment_ref>", methods=["GET"])
+def nagad_verify(payment_ref):
+    payment = PAYMENTS.get(payment_ref)
+    if payment is None:
+        return jsonify({"reason": "Not found"}), 404
+    status = {"SUCCESS": "Success", "FAILED": "Failed"}.get(payment["status"], "Initiated")
+    return jsonify({"paymentRefId": payment_ref, "orderId": payment.get("orderId"), "amount": payment["amount"], "status": status}), 200
+
+
+# Simulator helpers (not part of any real gateway)
+
 @app.route("/v1.2.0-beta/mock/send_webhook/<payment_id>", methods=["POST"])
 def send_webhook(payment_id):
-    # This endpoint doesn't exist on real bKash; it's for local dev only.
-    # It will POST to your app's webhook endpoint (SITE_URL/api/payments/webhook/)
-    import requests, json
-    if payment_id not in PAYMENTS:
+    # Posts the callback right away (SITE_URL/api/payments/webhook/).
+    site = request.args.get("site", WEBHOOK_SITE)
+    if PAYMENTS.get(payment_id) is None:
         return jsonify({"message": "Not found"}), 404
-
-    site = request.args.get("site", "http://127.0.0.1:8000")
-    webhook_url = f"{site}/api/payments/webhook/"
-    payload = {
-        "paymentID": payment_id,
-        "status": "SUCCESS",
-        "transaction_id": request.args.get("txid") or ""
-    }
+    if request.args.get("txid"):
+        PAYMENTS.update(payment_id, transaction_id=request.args["txid"])
     try:
-        r = requests.post(webhook_url, json=payload, timeout=5)
-        return jsonify({"posted_to": webhook_url, "status_code": r.status_code, "response_text": r.text}), 200
+        r = webhooks.send(payment_id, status=request.args.get("status", "SUCCESS").upper(), site=site)
+        return jsonify({"posted_to": f"{site}/api/payments/webhook/", "status_code": r.status_code, "response_text": r.text}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/mock/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        **STATS,
+        "payments": len(PAYMENTS),
+        "evicted": PAYMENTS.evicted,
+        "webhooks": {**webhooks.stats, "pending": webhooks.pending()},
+    }), 200
+
+
 if __name__ == "__main__":
-    print("Mock bKash server running at http://127.0.0.1:9000")
-    app.run(port=9000)
+    port = int(os.getenv("MOCK_PORT", 9000))
+    print(f"Mock gateway simulator running at http://127.0.0.1:{port}")
+    app.run(port=port, threaded=True)
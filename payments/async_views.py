@@ -0,0 +1,62 @@
+import contextlib, json
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from accounts.authentication import request_user
+from .gateways import GatewayError, is_supported
+from .serializers import PaymentCreateSerializer
+from .services import ainitiate_payment
+from .utils import async_gateway_client
+
+
+@sync_to_async
+def _create(request, data):
+
+    serializer = PaymentCreateSerializer(data=data, context={'request': request})
+    if not serializer.is_valid():
+        return None, serializer.errors
+    return serializer.save(), None
+
+
+@csrf_exempt
+@require_POST
+async def payment_create_async(request):
+    """
+    Same contract as PaymentCreateView's synchronous path, but the gateway
+    call is awaited on the asyncio HTTP client, so a slow gateway holds no
+    thread while the payment is created. Serve through ASGI to benefit.
+    Idempotency-Key is only honoured by PaymentCreateView.
+    """
+    if request.headers.get('Idempotency-Key'):
+        return JsonResponse({"detail": "Idempotency-Key is only supported on /api/payments/create/."}, status=400)
+
+    user = await sync_to_async(request_user)(request)
+    if user is None:
+        return JsonResponse({"detail": "Invalid or missing token."}, status=401)
+    request.user = user
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({"detail": "Invalid JSON."}, status=400)
+
+    payment, errors = await _create(request, data)
+    if errors:
+        return JsonResponse(errors, status=400)
+    if not is_supported(payment.payment_method):
+        return JsonResponse({"error": "Unsupported payment method."}, status=400)
+
+    # Under WSGI each request runs on a fresh event loop; keep no pooled client on it.
+    scope = contextlib.nullcontext() if isinstance(request, ASGIRequest) else async_gateway_client.scoped()
+    try:
+        async with scope:
+            data, http_status = await ainitiate_payment(payment)
+    except GatewayError as e:
+        return JsonResponse({"detail": str(e)}, status=502)
+
+    return JsonResponse(
+        {"transaction_id": payment.transaction_id, "status": payment.status, "gateway_response": data},
+        status=http_status,
+    )
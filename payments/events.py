@@ -0,0 +1,30 @@
+from .models import PaymentEvent
+
+
+def record_event(payment, kind, payload):
+    
+    return PaymentEvent.objects.create(payment=payment, kind=kind, payload=payload)
+
+
+def bulk_record_events(events, batch_size=500):
+    """
+    Inserts ``(payment_id, kind, payload)`` tuples with a single multi-row
+    INSERT per batch. Events are append-only, so nothing is ever updated.
+    """
+    if not events:
+        return []
+    return PaymentEvent.objects.bulk_create(
+        [PaymentEvent(payment_id=payment_id, kind=kind, payload=payload) for payment_id, kind, payload in events],
+        batch_size=batch_size,
+    )
+
+
+def latest_gateway_response(payment):
+    
+    event = (
+        PaymentEvent.objects.filter(payment=payment, kind__in=['RESPONSE', 'ERROR'])
+        .order_by('-created_at', '-id')
+        .only('payload')
+        .first()
+    )
+    return event.payload if event else None
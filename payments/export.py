@@ -0,0 +1,133 @@
+import csv, json, zlib
+from datetime import datetime
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Payment
+
+EXPORT_COLUMNS = (
+    ('transaction_id', 'transaction_id'),
+    ('user_id', 'user_id'),
+    ('user_email', 'user__email'),
+    ('payment_method', 'payment_method'),
+    ('amount', 'amount'),
+    ('currency', 'currency'),
+    ('status', 'status'),
+    ('gateway_reference', 'gateway_reference'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+)
+
+EXPORT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _parse_bound(name, value):
+    
+    try:
+        parsed = parse_datetime(value) or parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"{name} must be an ISO 8601 date or datetime.")
+    if not isinstance(parsed, datetime):
+        parsed = datetime.combine(parsed, datetime.min.time())
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def export_rows(since=None, until=None, status=None, method=None, chunk_size=2000):
+    """
+    Yields payment rows as tuples in EXPORT_COLUMNS order. ``iterator`` uses a
+    server-side cursor on PostgreSQL, so only ``chunk_size`` rows are held in
+    memory at a time however large the export is.
+    """
+    queryset = Payment.objects.order_by('created_at', 'id')
+    if since:
+        queryset = queryset.filter(created_at__gte=_parse_bound('since', since))
+    if until:
+        queryset = queryset.filter(created_at__lt=_parse_bound('until', until))
+    if status:
+        queryset = queryset.filter(status=status.upper())
+    if method:
+        queryset = queryset.filter(payment_method=method.upper())
+
+    return queryset.values_list(*[field for _, field in EXPORT_COLUMNS]).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _json_value(value):
+    
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _ndjson_lines(rows):
+    
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), default=_json_value) + "\n"
+
+
+def _buffered(lines, size=64 * 1024):
+    
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(buffer).encode()
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def _gzipped(chunks):
+    
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(rows, export_type='csv', gzip=False):
+    """Turns ``rows`` into a stream of encoded (optionally gzipped) byte chunks."""
+    if export_type not in EXPORT_TYPES:
+        raise ValueError(f"Unsupported export type: {export_type}")
+    lines = _csv_lines(rows) if export_type == 'csv' else _ndjson_lines(rows)
+    chunks = _buffered(lines)
+    return _gzipped(chunks) if gzip else chunks
+
+
+async def aiter_export(chunks):
+    """
+    Async wrapper for ASGI. Django buffers a sync iterator into a list
+    before sending it under ASGI; this pulls one chunk at a time on the
+    request's sync thread (the one that opened the cursor) instead.
+    """
+    sentinel = object()
+    pull = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await pull(chunks, sentinel)
+            if chunk is sentinel:
+                return
+            yield chunk
+    finally:
+        # Client went away mid-export: close the generators and the cursor.
+        await sync_to_async(chunks.close, thread_sensitive=True)()
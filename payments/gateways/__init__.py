@@ -0,0 +1,32 @@
+_registry = {}
+
+
+def register(adapter_class):
+    """Class decorator registering an adapter under its ``method`` key."""
+    _registry[adapter_class.method] = adapter_class()
+    return adapter_class
+
+
+def get_gateway(method):
+    
+    try:
+        return _registry[method]
+    except KeyError:
+        raise ValueError(f"Unsupported payment method: {method}")
+
+
+def is_supported(method):
+    return method in _registry
+
+
+def parse_webhook(payload):
+    """Asks each gateway to recognise ``payload``; returns the first match."""
+    for adapter in _registry.values():
+        parsed = adapter.parse_webhook(payload)
+        if parsed:
+            return parsed
+    return None
+
+
+from .base import CreateResult, GatewayAdapter, GatewayError  # noqa: E402
+from . import bkash, nagad  # noqa: E402,F401  (register the built-in adapters)
@@ -0,0 +1,93 @@
+from asgiref.sync import sync_to_async
+from ..utils import async_gateway_client, gateway_client
+
+
+class GatewayError(Exception):
+    pass
+
+
+class CreateResult:
+    """
+    Outcome of a create call. ``accepted`` tells whether the gateway took the
+    payment (it is then PROCESSING); ``request`` is what was sent, without
+    credentials, for the payment's event timeline.
+    """
+
+    def __init__(self, request, response, http_status, reference=None, accepted=True):
+        self.request = request
+        self.response = response
+        self.http_status = http_status
+        self.reference = reference
+        self.accepted = accepted
+
+
+class GatewayAdapter:
+    """
+    Interface every payment gateway implements. ``method`` is the
+    Payment.METHOD_CHOICES key the adapter is registered under.
+
+    Adapters describe each call as a request dict (method, url, json,
+    headers) and parse the response in one place, so the blocking methods
+    (create, status, refund) and their asyncio counterparts (acreate,
+    astatus, arefund) share all gateway-specific logic and only differ in
+    the HTTP client used to send the request.
+
+    An operation a gateway does not offer raises GatewayError, like any
+    other gateway failure, so callers only ever need to handle that.
+    """
+
+    method = None
+
+    def unsupported(self, operation):
+        
+        return GatewayError(f"{self.method} does not support {operation}.")
+
+    def create(self, payment):
+        raise self.unsupported('create')
+
+    def status(self, reference):
+        """Returns (final Payment status or None while still open, raw response)."""
+        raise self.unsupported('status queries')
+
+    def refund(self, payment, amount=None, **kwargs):
+        raise self.unsupported('refunds')
+
+    def parse_webhook(self, payload):
+        """
+        Normalises a callback body to ``{"transaction_id", "gateway_reference",
+        "status"}``, or returns None when the payload is not from this gateway.
+        """
+        return None
+
+    async def acreate(self, payment):
+        raise self.unsupported('create')
+
+    async def astatus(self, reference):
+        raise self.unsupported('status queries')
+
+    async def arefund(self, payment, amount=None, **kwargs):
+        raise self.unsupported('refunds')
+
+    def send(self, request):
+        
+        request = dict(request)
+        res = gateway_client.request(self.method, request.pop('method'), request.pop('url'), **request)
+        return res.status_code, _json_or_none(res)
+
+    async def asend(self, request):
+        
+        request = dict(request)
+        res = await async_gateway_client.request(self.method, request.pop('method'), request.pop('url'), **request)
+        return res.status_code, _json_or_none(res)
+
+    async def run_sync(self, fn, *args):
+        
+        return await sync_to_async(fn, thread_sensitive=False)(*args)
+
+
+def _json_or_none(res):
+    
+    try:
+        return res.json()
+    except ValueError:
+        return None
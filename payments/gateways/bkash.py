@@ -0,0 +1,149 @@
+import uuid
+from django.conf import settings
+from ..utils import bkash_token_manager, get_bkash_token
+from . import register
+from .base import CreateResult, GatewayAdapter, GatewayError
+
+
+BKASH_STATUS_MAP = {
+    'Completed': 'SUCCESS',
+    'Failed': 'FAILED',
+    'Expired': 'FAILED',
+    'Cancelled': 'CANCELED',
+}
+
+
+@register
+class BkashGateway(GatewayAdapter):
+
+    method = 'BKASH'
+
+    def _request(self, token, path, payload):
+        
+        return {
+            "method": "POST",
+            "url": f"{settings.BKASH_BASE_URL}/tokenized/checkout/{path}",
+            "json": payload,
+            "headers": {
+                "Authorization": f"Bearer {token}",
+                "X-APP-Key": settings.BKASH_APP_KEY,
+                "Content-Type": "application/json"
+            },
+        }
+
+    def _token(self):
+        
+        token = get_bkash_token()
+        if not token:
+            raise GatewayError("Unable to obtain bKash sandbox token. Check BKASH_* credentials.")
+        return token
+
+    def _check_auth(self, http_status):
+        
+        if http_status == 401:
+            bkash_token_manager.invalidate()
+
+    # create
+
+    def _create_request(self, payment, token):
+        
+        payload = {
+            
+            "mode": "0011",
+            "payerReference": str(payment.user_id),
+            "callbackURL": f"{settings.SITE_URL}/api/payments/webhook/",
+            "amount": str(payment.amount),
+            "currency": "BDT",
+            "intent": "sale",
+            "merchantInvoiceNumber": str(uuid.uuid4())[:10],
+        }
+        return self._request(token, 'create', payload)
+
+    def _create_result(self, request, http_status, data):
+        
+        self._check_auth(http_status)
+        logged_request = {"url": request['url'], "body": request['json']}
+        if data is None:
+            return CreateResult(logged_request, {"error": "Invalid response from bKash sandbox."}, http_status, accepted=False)
+        # Typical success fields: paymentID, bkashURL
+        return CreateResult(logged_request, data, http_status, reference=data.get("paymentID"))
+
+    def create(self, payment):
+        
+        request = self._create_request(payment, self._token())
+        try:
+            http_status, data = self.send(request)
+        except Exception as e:
+            raise GatewayError(f"bKash create error: {e}")
+        return self._create_result(request, http_status, data)
+
+    async def acreate(self, payment):
+        
+        request = self._create_request(payment, await self.run_sync(self._token))
+        try:
+            http_status, data = await self.asend(request)
+        except Exception as e:
+            raise GatewayError(f"bKash create error: {e}")
+        return self._create_result(request, http_status, data)
+
+    # status
+
+    def _status_result(self, http_status, data):
+        
+        self._check_auth(http_status)
+        if http_status != 200 or data is None:
+            raise GatewayError(f"bKash status query failed with HTTP {http_status}.")
+        return BKASH_STATUS_MAP.get(data.get('transactionStatus')), data
+
+    def status(self, reference):
+        
+        request = self._request(self._token(), 'payment/status', {"paymentID": reference})
+        return self._status_result(*self.send(request))
+
+    async def astatus(self, reference):
+        
+        request = self._request(await self.run_sync(self._token), 'payment/status', {"paymentID": reference})
+        return self._status_result(*await self.asend(request))
+
+    # refund
+
+    def _refund_request(self, token, payment, amount, trx_id, reason):
+        
+        payload = {
+            "paymentID": payment.gateway_reference,
+            "trxID": trx_id,
+            "amount": str(amount or payment.amount),
+            "sku": payment.transaction_id,
+            "reason": reason or "Refund",
+        }
+        return self._request(token, 'payment/refund', payload)
+
+    def _refund_result(self, http_status, data):
+        
+        self._check_auth(http_status)
+        if http_status != 200 or data is None:
+            raise GatewayError(f"bKash refund failed with HTTP {http_status}.")
+        return data
+
+    def refund(self, payment, amount=None, trx_id=None, reason=None):
+        
+        request = self._refund_request(self._token(), payment, amount, trx_id, reason)
+        return self._refund_result(*self.send(request))
+
+    async def arefund(self, payment, amount=None, trx_id=None, reason=None):
+        
+        request = self._refund_request(await self.run_sync(self._token), payment, amount, trx_id, reason)
+        return self._refund_result(*await self.asend(request))
+
+    # webhooks
+
+    def parse_webhook(self, payload):
+        
+        reference = payload.get('paymentID') or payload.get('gateway_reference')
+        if not (reference or payload.get('transaction_id')):
+            return None
+        return {
+            "transaction_id": payload.get('transaction_id') or None,
+            "gateway_reference": reference,
+            "status": (payload.get('status') or '').upper(),
+        }
@@ -0,0 +1,118 @@
+import base64, os, uuid
+from django.conf import settings
+from . import register
+from .base import CreateResult, GatewayAdapter, GatewayError
+
+
+NAGAD_STATUS_MAP = {
+    'Success': 'SUCCESS',
+    'Failed': 'FAILED',
+    'Cancelled': 'CANCELED',
+    'Aborted': 'CANCELED',
+}
+
+
+@register
+class NagadGateway(GatewayAdapter):
+
+    method = 'NAGAD'
+
+    @property
+    def base_url(self):
+        return getattr(settings, 'NAGAD_BASE_URL', 'https://sandbox.mynagad.com')
+
+    # create
+
+    def _create_request(self, payment):
+        
+        merchant_id = getattr(settings, 'NAGAD_MERCHANT_ID', getattr(settings, 'NAGAD_APP_MERCHANTID', '6800000025'))
+        callback_url = f"{settings.SITE_URL}/api/payments/webhook/"
+
+        payload = {
+            "merchantId": merchant_id,
+            "orderId": str(uuid.uuid4())[:10],
+            "currencyCode": "050",
+            "amount": str(payment.amount),
+            "challenge": base64.b64encode(os.urandom(16)).decode(),
+            "callbackUrl": callback_url,
+            "productDetails": "Demo purchase"
+        }
+        return {
+            "method": "POST",
+            "url": f"{self.base_url}/remote-payment-gateway-1.0/api/dfs/check-out/initialize",
+            "json": payload,
+            "headers": {"Content-Type": "application/json"},
+        }
+
+    def _create_result(self, request, data):
+        
+        logged_request = {"url": request['url'], "body": request['json']}
+        # The sandbox is often unreachable; the payment still moves to PROCESSING
+        # and is settled by the callback or the reconciler.
+        return CreateResult(logged_request, data, 201, reference=(data or {}).get('paymentReferenceId'))
+
+    def create(self, payment):
+        
+        request = self._create_request(payment)
+        try:
+            _, data = self.send(request)
+            print("🔹 NAGAD RESPONSE:", data)
+        except Exception as e:
+            print("⚠️ Nagad Sandbox Error:", e)
+            data = {"error": "Nagad sandbox not reachable"}
+        return self._create_result(request, data)
+
+    async def acreate(self, payment):
+        
+        request = self._create_request(payment)
+        try:
+            _, data = await self.asend(request)
+        except Exception as e:
+            print("⚠️ Nagad Sandbox Error:", e)
+            data = {"error": "Nagad sandbox not reachable"}
+        return self._create_result(request, data)
+
+    # status
+
+    def _status_request(self, reference):
+        
+        return {
+            "method": "GET",
+            "url": f"{self.base_url}/remote-payment-gateway-1.0/api/dfs/verify/payment/{reference}",
+            "headers": {"Content-Type": "application/json"},
+        }
+
+    def _status_result(self, http_status, data):
+        
+        if http_status != 200 or data is None:
+            raise GatewayError(f"Nagad verify failed with HTTP {http_status}.")
+        return NAGAD_STATUS_MAP.get(data.get('status')), data
+
+    def status(self, reference):
+        
+        return self._status_result(*self.send(self._status_request(reference)))
+
+    async def astatus(self, reference):
+        
+        return self._status_result(*await self.asend(self._status_request(reference)))
+
+    # refund
+
+    def refund(self, payment, amount=None, **kwargs):
+        raise GatewayError("Nagad refunds are not available through the merchant API.")
+
+    async def arefund(self, payment, amount=None, **kwargs):
+        raise GatewayError("Nagad refunds are not available through the merchant API.")
+
+    # webhooks
+
+    def parse_webhook(self, payload):
+        
+        reference = payload.get('payment_ref_id') or payload.get('paymentRefId')
+        if not reference:
+            return None
+        return {
+            "transaction_id": None,
+            "gateway_reference": reference,
+            "status": NAGAD_STATUS_MAP.get(payload.get('status'), (payload.get('status') or '').upper()),
+        }
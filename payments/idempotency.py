@@ -0,0 +1,106 @@
+import hashlib, json, time
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+
+def _request_hash(request):
+    
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}:{request.path}:{body}".encode()).hexdigest()
+
+
+def _claim(user, key, request_hash):
+    
+    ttl = getattr(settings, 'PAYMENT_IDEMPOTENCY_TTL', 24 * 3600)
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user,
+                key=key,
+                request_hash=request_hash,
+                expires_at=timezone.now() + timedelta(seconds=ttl),
+            )
+    except IntegrityError:
+        return None
+
+
+def _replay(record):
+    
+    response = Response(record.response_body, status=record.response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent_response(request, key, handler):
+    """
+    Runs ``handler`` at most once per (user, Idempotency-Key) within the TTL.
+
+    The first request claims the key and stores its response; replays get the
+    stored response without calling the gateway again. A duplicate that
+    arrives while the first one is still running waits for it to finish.
+    """
+    if len(key) > 255:
+        return Response({"detail": "Idempotency-Key is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+    request_hash = _request_hash(request)
+    lock_timeout = getattr(settings, 'PAYMENT_IDEMPOTENCY_LOCK_TIMEOUT', 60)
+    deadline = time.monotonic() + getattr(settings, 'PAYMENT_IDEMPOTENCY_WAIT', 10)
+    delay = 0.05
+
+    while True:
+        record = _claim(request.user, key, request_hash)
+        if record is not None:
+            break
+
+        now = timezone.now()
+        existing = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        # None: the holder deleted it in between (failed or expired); claim again after the wait.
+        if existing is not None:
+            abandoned = existing.response_status is None and existing.created_at < now - timedelta(seconds=lock_timeout)
+            if existing.expires_at <= now or abandoned:
+                IdempotencyKey.objects.filter(pk=existing.pk, created_at=existing.created_at).delete()
+                continue
+
+            if existing.request_hash != request_hash:
+                return Response(
+                    {"detail": "Idempotency-Key was already used with a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+
+            if existing.response_status is not None:
+                return _replay(existing)
+
+        if time.monotonic() >= deadline:
+            return Response(
+                {"detail": "A request with this Idempotency-Key is still being processed."},
+                status=status.HTTP_409_CONFLICT
+            )
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+    try:
+        response = handler()
+    except Exception:
+        record.delete()
+        raise
+
+    # Server / gateway errors are not stored so the client can retry with the same key.
+    if response.status_code >= 500:
+        record.delete()
+        return response
+
+    # An update, not save(): if the record was taken over as abandoned while the
+    # handler ran, the response still goes out; it just is not stored for replays.
+    IdempotencyKey.objects.filter(pk=record.pk).update(response_status=response.status_code, response_body=response.data)
+    return response
+
+
+def purge_expired_idempotency_keys():
+    
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
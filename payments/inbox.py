@@ -0,0 +1,165 @@
+import hashlib, json, threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+from core.background import submit, submit_at
+from .events import bulk_record_events
+from .gateways import parse_webhook
+from .models import Payment, WebhookInbox
+from .state import bulk_transition
+
+_drain_lock = threading.Lock()
+_drain_scheduled = False
+
+
+def enqueue_webhook(raw):
+    """
+    Appends a verified webhook body to the inbox. Identical deliveries hash
+    to the same row, so gateway retries are absorbed by the unique index.
+    """
+    WebhookInbox.objects.bulk_create(
+        [WebhookInbox(payload=raw.decode('utf-8'), payload_hash=hashlib.sha256(raw).hexdigest())],
+        ignore_conflicts=True,
+    )
+    if getattr(settings, 'PAYMENT_WEBHOOK_AUTO_DRAIN', True):
+        transaction.on_commit(schedule_drain)
+
+
+def schedule_drain():
+    
+    global _drain_scheduled
+    with _drain_lock:
+        if _drain_scheduled:
+            return
+        _drain_scheduled = True
+    submit(_drain_in_background)
+
+
+def _drain_in_background():
+    
+    global _drain_scheduled
+    with _drain_lock:
+        _drain_scheduled = False
+    while process_webhook_inbox()['fetched']:
+        pass
+    schedule_retry()
+
+
+def schedule_retry():
+    """Wakes the drain again when the earliest deferred (unmatched) delivery is due."""
+    due = WebhookInbox.objects.filter(processed_at__isnull=True).aggregate(due=Min('next_attempt_at'))['due']
+    if due is not None:
+        submit_at('webhook-inbox-retry', due, _drain_in_background)
+
+
+def retry_delay(attempts):
+
+    base = getattr(settings, 'PAYMENT_WEBHOOK_RETRY_BACKOFF', 2)
+    return timedelta(seconds=min(base * 2 ** attempts, getattr(settings, 'PAYMENT_WEBHOOK_RETRY_MAX_DELAY', 300)))
+
+
+def _payment_key(parsed):
+    
+    if parsed.get('transaction_id'):
+        return ('transaction_id', parsed['transaction_id'])
+    if parsed.get('gateway_reference'):
+        return ('gateway_reference', parsed['gateway_reference'])
+    return None
+
+
+def process_webhook_inbox(batch_size=None):
+    """
+    Drains one batch of due webhooks. Every matched delivery is appended
+    to the payment's event timeline; for status, deliveries for the same
+    payment collapse to the first final one and the batch's changes are applied
+    with bulk_transition (a few conditional UPDATEs), so a late FAILED can
+    never overwrite SUCCESS.
+
+    A delivery whose payment is not found yet (the callback beat the write of
+    gateway_reference) stays pending and is retried with backoff until it is
+    PAYMENT_WEBHOOK_UNMATCHED_MAX_AGE seconds old.
+    """
+    batch_size = batch_size or getattr(settings, 'PAYMENT_WEBHOOK_BATCH_SIZE', 500)
+    now = timezone.now()
+
+    with transaction.atomic():
+        rows = sorted(
+            WebhookInbox.objects.filter(processed_at__isnull=True, next_attempt_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('next_attempt_at', 'id')[:batch_size],
+            # Deliveries are applied in arrival order.
+            key=lambda row: row.pk,
+        )
+        if not rows:
+            return {"fetched": 0, "applied": 0, "failed": 0, "deferred": 0}
+
+        errors = {}
+        deliveries = []
+        for row in rows:
+            try:
+                payload = json.loads(row.payload or "{}")
+            except ValueError:
+                errors.setdefault("Invalid JSON.", []).append(row.pk)
+                continue
+
+            parsed = parse_webhook(payload) if isinstance(payload, dict) else None
+            key = _payment_key(parsed) if parsed else None
+            if key is None:
+                errors.setdefault("Missing transaction identifiers.", []).append(row.pk)
+                continue
+            deliveries.append((row.pk, key, payload, parsed['status']))
+
+        txids = {key[1] for _, key, _, _ in deliveries if key[0] == 'transaction_id'}
+        refs = {key[1] for _, key, _, _ in deliveries if key[0] == 'gateway_reference'}
+        payments = {}
+        matches = Payment.objects.filter(Q(transaction_id__in=txids) | Q(gateway_reference__in=refs)).only(
+            'id', 'user_id', 'transaction_id', 'gateway_reference', 'payment_method',
+            'status', 'amount', 'currency', 'created_at', 'updated_at',
+        )
+        for payment in matches:
+            payments[('transaction_id', payment.transaction_id)] = payment
+            if payment.gateway_reference:
+                payments[('gateway_reference', payment.gateway_reference)] = payment
+
+        received = {row.pk: row for row in rows}
+        max_age = timedelta(seconds=getattr(settings, 'PAYMENT_WEBHOOK_UNMATCHED_MAX_AGE', 3600))
+        events = []
+        deferred = []
+        changes = {}
+        for row_pk, key, payload, new_status in deliveries:
+            payment = payments.get(key)
+            if payment is not None:
+                events.append((payment.pk, 'WEBHOOK', payload))
+                # Final statuses are terminal: per payment (whichever identifier
+                # the gateway used), the first one delivered wins.
+                if new_status in Payment.FINAL_STATUSES and payment.pk not in changes:
+                    changes[payment.pk] = (payment, new_status)
+            elif now - received[row_pk].received_at < max_age:
+                deferred.append(received[row_pk])
+            else:
+                errors.setdefault("Payment not found.", []).append(row_pk)
+        bulk_record_events(events)
+        applied = bulk_transition(changes.values())
+
+        failed_ids = set()
+        for message, ids in errors.items():
+            WebhookInbox.objects.filter(pk__in=ids).update(processed_at=now, error=message)
+            failed_ids.update(ids)
+        for row in deferred:
+            row.attempts += 1
+            row.next_attempt_at = now + retry_delay(row.attempts)
+            row.error = "Payment not found yet."
+        WebhookInbox.objects.bulk_update(deferred, ['attempts', 'next_attempt_at', 'error'])
+        done = failed_ids | {row.pk for row in deferred}
+        WebhookInbox.objects.filter(pk__in=[row.pk for row in rows if row.pk not in done]).update(processed_at=now, error=None)
+
+    return {"fetched": len(rows), "applied": len(applied), "failed": len(failed_ids), "deferred": len(deferred)}
+
+
+def purge_processed_webhooks(older_than_days):
+    
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = WebhookInbox.objects.filter(processed_at__lt=cutoff).delete()
+    return deleted
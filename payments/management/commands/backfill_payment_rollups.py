@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from payments.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+
+    help = "Rebuild the payment rollup table from existing payments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="First day to rebuild (YYYY-MM-DD). Default: all history.")
+        parser.add_argument('--until', help="Day after the last one to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        
+        bounds = {}
+        for name in ('since', 'until'):
+            if options[name]:
+                bounds[name] = parse_date(options[name])
+                if bounds[name] is None:
+                    raise CommandError(f"--{name} must be a YYYY-MM-DD date.")
+
+        buckets = rebuild_rollups(**bounds)
+        self.stdout.write(f"buckets={buckets}")
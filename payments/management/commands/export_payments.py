@@ -0,0 +1,41 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from payments.export import EXPORT_TYPES, export_rows, stream_export
+
+
+class Command(BaseCommand):
+
+    help = "Stream payments as CSV or NDJSON to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=list(EXPORT_TYPES), default='csv')
+        parser.add_argument('--gzip', action='store_true', help="Compress the output on the fly.")
+        parser.add_argument('--output', '-o', help="File to write to. Default: stdout.")
+        parser.add_argument('--since', help="Created at or after (ISO date / datetime).")
+        parser.add_argument('--until', help="Created before (ISO date / datetime).")
+        parser.add_argument('--status')
+        parser.add_argument('--method')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        
+        try:
+            rows = export_rows(
+                since=options['since'],
+                until=options['until'],
+                status=options['status'],
+                method=options['method'],
+                chunk_size=options['chunk_size'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in stream_export(rows, options['type'], gzip=options['gzip']):
+                out.write(chunk)
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from payments.inbox import process_webhook_inbox, purge_processed_webhooks
+
+
+class Command(BaseCommand):
+
+    help = "Apply pending payment webhooks from the inbox in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help="Keep polling the inbox instead of exiting when it is empty.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep between polls when the inbox is empty.")
+        parser.add_argument('--purge-days', type=int, default=None, help="Delete processed webhooks older than this many days.")
+
+    def handle(self, *args, **options):
+        
+        while True:
+            result = process_webhook_inbox(batch_size=options['batch_size'])
+            if result['fetched']:
+                self.stdout.write(
+                    f"fetched={result['fetched']} applied={result['applied']} failed={result['failed']} deferred={result['deferred']}"
+                )
+                continue
+
+            if options['purge_days'] is not None:
+                deleted = purge_processed_webhooks(options['purge_days'])
+                if deleted:
+                    self.stdout.write(f"purged={deleted}")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from payments.idempotency import purge_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+
+    help = "Delete expired Idempotency-Key records."
+
+    def handle(self, *args, **options):
+        
+        deleted = purge_expired_idempotency_keys()
+        self.stdout.write(f"purged={deleted}")
@@ -0,0 +1,31 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from payments.reconciliation import Reconciler
+
+
+class Command(BaseCommand):
+
+    help = "Query the gateways for the final state of stale PROCESSING payments and re-dispatch lost PENDING ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=None, help="Only payments untouched for this many seconds.")
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--concurrency', type=int, default=None, help="Maximum parallel gateway calls.")
+        parser.add_argument('--limit', type=int, default=None, help="Stop after this many payments.")
+        parser.add_argument('--loop', action='store_true', help="Run continuously as a scheduler.")
+        parser.add_argument('--interval', type=int, default=60, help="Seconds between runs with --loop.")
+
+    def handle(self, *args, **options):
+        
+        reconciler = Reconciler(
+            concurrency=options['concurrency'],
+            chunk_size=options['chunk_size'],
+            older_than=timedelta(seconds=options['older_than']) if options['older_than'] else None,
+        )
+        while True:
+            stats = reconciler.run(limit=options['limit'])
+            self.stdout.write(" ".join(f"{key}={value}" for key, value in stats.items()))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_metadata_payloads(apps, schema_editor):
+    # Earlier versions kept the last webhook / async gateway response inside
+    # Payment.metadata; move them to the event timeline.
+    Payment = apps.get_model('payments', 'Payment')
+    PaymentEvent = apps.get_model('payments', 'PaymentEvent')
+
+    moved = {
+        'webhook_payload': 'WEBHOOK',
+        'gateway_response': 'RESPONSE',
+        'gateway_error': 'ERROR',
+    }
+    payments = Payment.objects.exclude(metadata={}).only('id', 'metadata', 'updated_at')
+    for payment in payments.iterator(chunk_size=500):
+        events = []
+        for key, kind in moved.items():
+            if key in payment.metadata:
+                value = payment.metadata.pop(key)
+                events.append(PaymentEvent(payment_id=payment.pk, kind=kind, payload=value if isinstance(value, dict) else {"error": value}))
+        if events:
+            PaymentEvent.objects.bulk_create(events)
+            Payment.objects.filter(pk=payment.pk).update(metadata=payment.metadata)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_payment_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('REQUEST', 'Gateway request'), ('RESPONSE', 'Gateway response'), ('ERROR', 'Gateway error'), ('WEBHOOK', 'Webhook')], max_length=10)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='payments.payment')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['payment', 'created_at'], name='payment_event_timeline_idx')],
+            },
+        ),
+        migrations.RunPython(move_metadata_payloads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_payment_created_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='webhookinbox',
+            name='webhook_inbox_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='webhookinbox',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='webhookinbox',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='webhookinbox',
+            index=models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['next_attempt_at', 'id'], name='webhook_inbox_pending_idx'),
+        ),
+    ]
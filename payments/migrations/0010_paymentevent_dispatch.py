@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0009_webhookinbox_retry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentevent',
+            name='kind',
+            field=models.CharField(choices=[('REQUEST', 'Gateway request'), ('RESPONSE', 'Gateway response'), ('ERROR', 'Gateway error'), ('WEBHOOK', 'Webhook'), ('DISPATCH', 'Queued for dispatch')], max_length=10),
+        ),
+    ]
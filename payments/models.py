@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.conf import settings
 import uuid
 
@@ -17,6 +18,8 @@ class Payment(models.Model):
         ('CANCELED', 'Canceled'),
     )
 
+    FINAL_STATUSES = ('SUCCESS', 'FAILED', 'CANCELED')
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='payments')
     payment_method = models.CharField(max_length=10, choices=METHOD_CHOICES)
@@ -34,6 +37,99 @@ class Payment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='payment_user_created_idx'),
+            models.Index(fields=['status', 'updated_at'], name='payment_status_updated_idx'),
+            models.Index(fields=['-created_at', '-id'], name='payment_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.payment_method} {self.amount} {self.currency} [{self.status}]"
+
+
+class WebhookInbox(models.Model):
+
+    payload = models.TextField()
+    payload_hash = models.CharField(max_length=64, unique=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    error = models.CharField(max_length=255, blank=True, null=True)
+    # Deliveries that arrive before their payment can be matched are retried.
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at', 'id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='webhook_inbox_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Webhook #{self.pk} [{'processed' if self.processed_at else 'pending'}]"
+
+
+class IdempotencyKey(models.Model):
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.response_status or 'in flight'})"
+
+
+class PaymentEvent(models.Model):
+
+    KIND_CHOICES = (
+        ('REQUEST', 'Gateway request'),
+        ('RESPONSE', 'Gateway response'),
+        ('ERROR', 'Gateway error'),
+        ('WEBHOOK', 'Webhook'),
+        ('DISPATCH', 'Queued for dispatch'),
+    )
+
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='events', db_index=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['payment', 'created_at'], name='payment_event_timeline_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for {self.payment_id} at {self.created_at}"
+
+
+class PaymentRollup(models.Model):
+
+    day = models.DateField()
+    payment_method = models.CharField(max_length=10, choices=Payment.METHOD_CHOICES)
+    status = models.CharField(max_length=12, choices=Payment.STATUS_CHOICES)
+    currency = models.CharField(max_length=8)
+    count = models.BigIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'payment_method', 'status', 'currency'], name='unique_payment_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.payment_method} {self.status}: {self.count} / {self.total_amount} {self.currency}"
@@ -0,0 +1,98 @@
+import asyncio, threading, time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+from .signals import payment_status_changed
+
+STATUS_CACHE_KEY = 'payments:status-event:{}'
+
+
+class StatusHub:
+    """
+    Fans payment status changes out to open status streams.
+
+    Subscribers are asyncio queues registered together with their event loop,
+    so publishers running in request or background threads hand messages over
+    with call_soon_threadsafe. With the 'cache' backend every change is also
+    written to the shared Django cache and streams poll it, which delivers
+    changes made by other processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    @property
+    def backend(self):
+        return getattr(settings, 'PAYMENT_STATUS_HUB_BACKEND', 'local')
+
+    def publish(self, transaction_id, message):
+        
+        if self.backend == 'cache':
+            cache.set(STATUS_CACHE_KEY.format(transaction_id), message, timeout=3600)
+
+        with self._lock:
+            subscribers = list(self._subscribers.get(transaction_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                # The stream's loop has already shut down.
+                pass
+
+    def subscribe(self, transaction_id):
+        
+        subscription = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[transaction_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, transaction_id, subscription):
+        
+        with self._lock:
+            subscribers = self._subscribers.get(transaction_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[transaction_id]
+
+    async def next_message(self, subscription, transaction_id, last_status, timeout):
+        """Returns the next status change, or None once ``timeout`` expires."""
+        queue = subscription[1]
+        if self.backend != 'cache':
+            try:
+                return await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        poll_interval = getattr(settings, 'PAYMENT_STATUS_HUB_POLL_INTERVAL', 1.0)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                return await asyncio.wait_for(queue.get(), min(poll_interval, remaining))
+            except asyncio.TimeoutError:
+                message = await cache.aget(STATUS_CACHE_KEY.format(transaction_id))
+                if message and message['status'] != last_status:
+                    return message
+
+
+status_hub = StatusHub()
+
+
+def status_message(payment):
+    
+    return {
+        "transaction_id": payment.transaction_id,
+        "status": payment.status,
+        "updated_at": payment.updated_at.isoformat() if payment.updated_at else None,
+    }
+
+
+@receiver(payment_status_changed)
+def publish_status_change(sender, payment, **kwargs):
+    
+    status_hub.publish(payment.transaction_id, status_message(payment))
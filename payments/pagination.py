@@ -0,0 +1,20 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PaymentCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (user, -created_at): every page is an index range
+    scan, so page 10,000 costs the same as page 1.
+    """
+    ordering = '-created_at'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class PaymentEventCursorPagination(CursorPagination):
+    
+    ordering = 'created_at'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,188 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .events import bulk_record_events
+from .models import Payment, PaymentEvent
+from .services import dispatch_payment
+from .state import bulk_transition
+from .gateways import get_gateway
+
+RECONCILE_FIELDS = (
+    'id', 'user_id', 'transaction_id', 'payment_method', 'gateway_reference',
+    'status', 'amount', 'currency', 'created_at', 'updated_at',
+)
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing ``rate`` calls per second."""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self._allowance = self.rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+                self._last = now
+                if self._allowance >= 1:
+                    self._allowance -= 1
+                    return
+                wait = (1 - self._allowance) / self.rate
+            time.sleep(wait)
+
+
+def stale_processing_chunks(older_than, chunk_size):
+    """
+    Yields stale PROCESSING payments chunk by chunk using keyset pagination
+    on (updated_at, id), so memory stays bounded however many rows match.
+    """
+    cutoff = timezone.now() - older_than
+    base = (
+        Payment.objects.filter(status='PROCESSING', updated_at__lt=cutoff, gateway_reference__isnull=False)
+        .only(*RECONCILE_FIELDS)
+        .order_by('updated_at', 'id')
+    )
+    last = None
+    while True:
+        queryset = base
+        if last is not None:
+            queryset = queryset.filter(Q(updated_at__gt=last[0]) | Q(updated_at=last[0], id__gt=last[1]))
+        chunk = list(queryset[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = (chunk[-1].updated_at, chunk[-1].id)
+
+
+def stale_pending(older_than, limit):
+    """
+    PENDING payments queued for async dispatch (see services.queue_dispatch)
+    and untouched for ``older_than``: dispatches lost to a restart (the client
+    already has its 202 and nothing else will send them). Synchronous creates
+    are never picked up; the client saw their outcome.
+    """
+    cutoff = timezone.now() - older_than
+    queued = PaymentEvent.objects.filter(payment=OuterRef('pk'), kind='DISPATCH')
+    return list(
+        Payment.objects.filter(Exists(queued), status='PENDING', updated_at__lt=cutoff)
+        .only(*RECONCILE_FIELDS)
+        .order_by('updated_at', 'id')[:limit]
+    )
+
+
+class Reconciler:
+    """
+    Asks the gateways for the final state of stuck PROCESSING payments, and
+    re-dispatches PENDING payments whose async dispatch was lost.
+
+    Status queries run on a bounded thread pool and are throttled per gateway;
+    each chunk's results are written back with bulk_transition, so a webhook
+    that settled the payment in the meantime is never overwritten.
+    """
+
+    def __init__(self, concurrency=None, chunk_size=None, older_than=None, rate_limits=None):
+        self.concurrency = concurrency or getattr(settings, 'PAYMENT_RECONCILE_CONCURRENCY', 16)
+        self.chunk_size = chunk_size or getattr(settings, 'PAYMENT_RECONCILE_CHUNK_SIZE', 500)
+        self.older_than = older_than or timedelta(seconds=getattr(settings, 'PAYMENT_RECONCILE_AFTER', 900))
+        self.dispatch_after = timedelta(seconds=getattr(settings, 'PAYMENT_DISPATCH_STALE_AFTER', 120))
+        self.dispatch_max_age = timedelta(seconds=getattr(settings, 'PAYMENT_DISPATCH_MAX_AGE', 3600))
+        rate_limits = rate_limits or getattr(settings, 'PAYMENT_GATEWAY_RATE_LIMITS', {})
+        self.limiters = {method: RateLimiter(rate_limits.get(method, 0)) for method, _ in Payment.METHOD_CHOICES}
+
+    def query(self, payment):
+        
+        self.limiters[payment.payment_method].acquire()
+        try:
+            new_status, data = get_gateway(payment.payment_method).status(payment.gateway_reference)
+            return payment, new_status, data, None
+        except Exception as e:
+            return payment, None, None, e
+
+    def dispatch(self, payment):
+
+        # Claim it first (the updated_at we read must still be current), so two
+        # reconcilers, or a slow original dispatch, never send it twice.
+        claimed = Payment.objects.filter(pk=payment.pk, status='PENDING', updated_at=payment.updated_at).update(
+            updated_at=timezone.now()
+        )
+        if not claimed:
+            return False
+        self.limiters[payment.payment_method].acquire()
+        try:
+            dispatch_payment(payment.pk)
+        except Exception:
+            pass  # dispatch_payment recorded the error and failed the payment
+        finally:
+            close_old_connections()
+        return True
+
+    def redispatch_pending(self, pool, stats, limit=None):
+        """Handles up to ``limit`` lost dispatches and returns how many it looked at."""
+        now = timezone.now()
+        handled = 0
+        while limit is None or handled < limit:
+            size = self.chunk_size if limit is None else min(self.chunk_size, limit - handled)
+            chunk = stale_pending(self.dispatch_after, size)
+            handled += len(chunk)
+            expired = [payment for payment in chunk if now - payment.created_at > self.dispatch_max_age]
+            stats['expired'] += len(bulk_transition((payment, 'FAILED') for payment in expired))
+            retry = [payment for payment in chunk if payment not in expired]
+            stats['redispatched'] += sum(pool.map(self.dispatch, retry))
+            if len(chunk) < size:
+                break
+        return handled
+
+    def run(self, limit=None):
+        
+        started = time.monotonic()
+        now = timezone.now()
+        stats = {"scanned": 0, "resolved": 0, "pending": 0, "errors": 0, "max_lag_seconds": 0.0, "redispatched": 0, "expired": 0}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='reconcile') as pool:
+            # --limit covers both passes: lost dispatches first, then stale PROCESSING.
+            redispatch_handled = self.redispatch_pending(pool, stats, limit)
+            for chunk in stale_processing_chunks(self.older_than, self.chunk_size):
+                if limit is not None:
+                    chunk = chunk[:max(limit - redispatch_handled - stats['scanned'], 0)]
+                    if not chunk:
+                        break
+
+                stats['scanned'] += len(chunk)
+                stats['max_lag_seconds'] = max(stats['max_lag_seconds'], (now - chunk[0].updated_at).total_seconds())
+
+                resolved = []
+                events = []
+                for payment, new_status, data, error in pool.map(self.query, chunk):
+                    if error is not None:
+                        stats['errors'] += 1
+                        events.append((payment.pk, 'ERROR', {"operation": "status", "error": str(error)}))
+                        continue
+                    events.append((payment.pk, 'RESPONSE', {"operation": "status", "body": data}))
+                    if new_status is None or new_status == payment.status:
+                        stats['pending'] += 1
+                    else:
+                        resolved.append((payment, payment.status, new_status))
+                bulk_record_events(events)
+                stats['resolved'] += len(self.apply(resolved))
+                close_old_connections()
+
+        elapsed = time.monotonic() - started
+        stats['elapsed_seconds'] = round(elapsed, 3)
+        stats['rows_per_second'] = round(stats['scanned'] / elapsed, 2) if elapsed else 0.0
+        stats['max_lag_seconds'] = round(stats['max_lag_seconds'], 1)
+        return stats
+
+    def apply(self, resolved):
+        
+        return bulk_transition((payment, new_status) for payment, _, new_status in resolved)
@@ -0,0 +1,94 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Payment, PaymentRollup
+from .signals import payment_statuses_changed
+
+
+def _bucket(payment, status):
+    
+    return (timezone.localtime(payment.created_at).date(), payment.payment_method, status, payment.currency)
+
+
+def apply_rollup_deltas(deltas):
+    """
+    Adds ``{(day, method, status, currency): (count, amount)}`` to the rollup
+    table with one atomic ``UPDATE ... SET count = count + n`` per bucket,
+    creating the bucket row the first time it is needed.
+    """
+    for (day, method, status, currency), (count, amount) in deltas.items():
+        if not count and not amount:
+            continue
+        bucket = PaymentRollup.objects.filter(day=day, payment_method=method, status=status, currency=currency)
+        increment = {"count": F('count') + count, "total_amount": F('total_amount') + amount}
+        if bucket.update(**increment):
+            continue
+        try:
+            with transaction.atomic():
+                PaymentRollup.objects.create(
+                    day=day, payment_method=method, status=status, currency=currency,
+                    count=count, total_amount=amount,
+                )
+        except IntegrityError:
+            # Another writer created the bucket first.
+            bucket.update(**increment)
+
+
+@receiver(post_save, sender=Payment)
+def count_new_payment(sender, instance, created, **kwargs):
+    
+    if created:
+        # Bucket by the status it was created with; a later transition in the
+        # same transaction moves it via move_changed_payments.
+        deltas = {_bucket(instance, instance.status): (1, Decimal(instance.amount))}
+        transaction.on_commit(lambda: apply_rollup_deltas(deltas))
+
+
+@receiver(payment_statuses_changed)
+def move_changed_payments(sender, changes, **kwargs):
+    
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for payment, previous_status in changes:
+        amount = Decimal(payment.amount)
+        old, new = deltas[_bucket(payment, previous_status)], deltas[_bucket(payment, payment.status)]
+        old[0] -= 1
+        old[1] -= amount
+        new[0] += 1
+        new[1] += amount
+    apply_rollup_deltas({key: tuple(value) for key, value in deltas.items()})
+
+
+def rebuild_rollups(since=None, until=None):
+    """
+    Recomputes the rollups from the payments table for ``[since, until)``
+    (dates; whole table when omitted). The aggregation runs in the
+    database, so only the bucket rows are transferred.
+    """
+    payments = Payment.objects.all()
+    rollups = PaymentRollup.objects.all()
+    if since:
+        payments = payments.filter(created_at__date__gte=since)
+        rollups = rollups.filter(day__gte=since)
+    if until:
+        payments = payments.filter(created_at__date__lt=until)
+        rollups = rollups.filter(day__lt=until)
+
+    buckets = (
+        payments.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'payment_method', 'status', 'currency')
+        .annotate(count=Count('id'), total_amount=Sum('amount'))
+    )
+
+    with transaction.atomic():
+        rollups.delete()
+        created = PaymentRollup.objects.bulk_create(
+            [PaymentRollup(**bucket) for bucket in buckets.iterator(chunk_size=2000)],
+            batch_size=1000,
+        )
+    return len(created)
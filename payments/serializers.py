@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Payment
+from .events import latest_gateway_response
+from .models import Payment, PaymentEvent
 import uuid
 
 
@@ -28,7 +29,26 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
         return payment
 
 
+class PaymentListSerializer(serializers.ModelSerializer):
+    
+    class Meta:
+        model = Payment
+        fields = ['transaction_id', 'payment_method', 'amount', 'currency', 'status', 'created_at']
+
+
 class PaymentStatusSerializer(serializers.ModelSerializer):
+    gateway_response = serializers.SerializerMethodField()
+
     class Meta:
         model = Payment
         fields = '__all__'
+
+    def get_gateway_response(self, obj):
+        return latest_gateway_response(obj)
+
+
+class PaymentEventSerializer(serializers.ModelSerializer):
+    
+    class Meta:
+        model = PaymentEvent
+        fields = ['id', 'kind', 'payload', 'created_at']
@@ -0,0 +1,100 @@
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from core.background import submit
+from .events import bulk_record_events
+from .gateways import GatewayError, get_gateway
+from .models import Payment
+from .state import transition
+
+
+def _apply_create_result(payment, result):
+    
+    if result.accepted:
+        transition(payment, 'PROCESSING', gateway_reference=result.reference or payment.gateway_reference)
+    else:
+        # The gateway did not take it; nothing would ever settle it otherwise.
+        transition(payment, 'FAILED')
+
+
+def _fail_create(payment, error):
+
+    bulk_record_events(_create_events(payment, error=error))
+    transition(payment, 'FAILED')
+
+
+def _create_events(payment, result=None, error=None):
+    
+    events = []
+    if result is not None:
+        events.append((payment.pk, 'REQUEST', {"operation": "create", **result.request}))
+        events.append((payment.pk, 'RESPONSE', {"operation": "create", "http_status": result.http_status, "body": result.response}))
+    if error is not None:
+        events.append((payment.pk, 'ERROR', {"operation": "create", "error": str(error)}))
+    return events
+
+
+def initiate_payment(payment):
+    """
+    Calls the gateway's create endpoint for ``payment`` and persists the
+    resulting reference / status. The request and response are appended to
+    the payment's event timeline. Returns ``(gateway_response, http_status)``
+    and raises GatewayError when the gateway could not be reached. A payment
+    the gateway did not accept, or whose create call raised, is FAILED.
+    """
+    gateway = get_gateway(payment.payment_method)
+    try:
+        result = gateway.create(payment)
+    except Exception as e:
+        _fail_create(payment, e)
+        raise
+
+    bulk_record_events(_create_events(payment, result))
+    _apply_create_result(payment, result)
+
+    return result.response, result.http_status
+
+
+async def ainitiate_payment(payment):
+    """
+    asyncio variant of initiate_payment used by payment_create_async: the
+    gateway call is awaited on the non-blocking HTTP client instead of
+    holding a thread.
+    """
+    gateway = get_gateway(payment.payment_method)
+    try:
+        result = await gateway.acreate(payment)
+    except Exception as e:
+        await sync_to_async(_fail_create)(payment, e)
+        raise
+
+    await sync_to_async(bulk_record_events)(_create_events(payment, result))
+    await sync_to_async(_apply_create_result)(payment, result)
+
+    return result.response, result.http_status
+
+
+def dispatch_payment(payment_id):
+    """
+    Background counterpart of initiate_payment used in async mode. The
+    gateway response (or error) lands in the payment's event timeline, from
+    where PaymentStatusView returns it. Dispatches lost to a restart are
+    picked up again by the reconciler (see reconciliation.stale_pending).
+    """
+    payment = Payment.objects.get(pk=payment_id)
+    if payment.status != 'PENDING':
+        return
+
+    try:
+        initiate_payment(payment)
+    except GatewayError:
+        pass  # recorded on the timeline and FAILED by initiate_payment
+
+
+def queue_dispatch(payment):
+    """
+    Marks ``payment`` as handed to the background dispatcher (a DISPATCH
+    event in the caller's transaction) and submits it after commit. Only
+    payments marked this way are re-dispatched by the reconciler.
+    """
+    bulk_record_events([(payment.pk, 'DISPATCH', {"operation": "create"})])
+    transaction.on_commit(lambda: submit(dispatch_payment, payment.pk))
@@ -0,0 +1,34 @@
+import copy
+from django.db import transaction
+from django.dispatch import Signal
+
+
+# Sent once a payment's status change has been committed.
+# Receivers get ``payment`` (with the new status) and ``previous_status``.
+payment_status_changed = Signal()
+
+# Sent once per committed batch of status changes, after the per-payment
+# signals. Receivers get ``changes``: a list of (payment, previous_status).
+# Aggregating receivers (e.g. rollups) use this to write once per batch.
+payment_statuses_changed = Signal()
+
+
+def statuses_changed(changes):
+    
+    # Snapshot each payment: receivers run on commit and must see the status
+    # of this change, not a later one made in the same transaction.
+    changes = [(copy.copy(payment), previous_status) for payment, previous_status in changes]
+    if not changes:
+        return
+
+    def send():
+        for payment, previous_status in changes:
+            payment_status_changed.send(sender=payment.__class__, payment=payment, previous_status=previous_status)
+        payment_statuses_changed.send(sender=changes[0][0].__class__, changes=changes)
+
+    transaction.on_commit(send)
+
+
+def status_changed(payment, previous_status):
+    
+    statuses_changed([(payment, previous_status)])
@@ -0,0 +1,86 @@
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from .models import Payment
+from .signals import statuses_changed
+
+# Allowed status transitions: PENDING -> PROCESSING -> SUCCESS / FAILED / CANCELED.
+# A payment can also fail or be canceled before the gateway accepted it.
+TRANSITIONS = {
+    'PENDING': ('PROCESSING', 'FAILED', 'CANCELED'),
+    'PROCESSING': ('SUCCESS', 'FAILED', 'CANCELED'),
+}
+
+# Reverse view: for each target, the statuses it may be reached from.
+ALLOWED_SOURCES = defaultdict(tuple)
+for _source, _targets in TRANSITIONS.items():
+    for _target in _targets:
+        ALLOWED_SOURCES[_target] += (_source,)
+
+APPLIED = 'applied'
+NOOP = 'noop'
+REJECTED = 'rejected'
+
+
+def can_transition(from_status, to_status):
+    return from_status in ALLOWED_SOURCES[to_status]
+
+
+def transition(payment, to_status, **fields):
+    """
+    Moves ``payment`` to ``to_status`` with a single conditional
+    ``UPDATE ... WHERE id = %s AND status = <source>``; no SELECT and no row
+    lock. The status the caller last saw is tried first, so the common case
+    is exactly one statement. Returns APPLIED, NOOP (already there, nothing
+    written) or REJECTED (the row is in a state that does not allow it).
+    """
+    if payment.status == to_status:
+        return NOOP
+
+    sources = ALLOWED_SOURCES[to_status]
+    if payment.status in sources:
+        sources = (payment.status,) + tuple(source for source in sources if source != payment.status)
+
+    now = timezone.now()
+    for source in sources:
+        updated = Payment.objects.filter(pk=payment.pk, status=source).update(status=to_status, updated_at=now, **fields)
+        if updated:
+            payment.status = to_status
+            payment.updated_at = now
+            for name, value in fields.items():
+                setattr(payment, name, value)
+            statuses_changed([(payment, source)])
+            return APPLIED
+    return REJECTED
+
+
+def bulk_transition(changes):
+    """
+    Applies many ``(payment, to_status)`` changes with one conditional UPDATE
+    per (current status, target) group. Changes that are no-ops or not
+    allowed from the payment's current status are skipped. Returns the
+    applied changes as ``(payment, previous_status)``.
+    """
+    groups = defaultdict(list)
+    for payment, to_status in changes:
+        if payment.status != to_status and can_transition(payment.status, to_status):
+            groups[(payment.status, to_status)].append(payment)
+    if not groups:
+        return []
+
+    now = timezone.now()
+    applied = []
+    with transaction.atomic():
+        for (source, target), group in groups.items():
+            ids = [payment.pk for payment in group]
+            updated = Payment.objects.filter(pk__in=ids, status=source).update(status=target, updated_at=now)
+            if updated != len(ids):
+                # Some rows moved concurrently; keep only the ones this UPDATE changed.
+                won = set(Payment.objects.filter(pk__in=ids, status=target, updated_at=now).values_list('pk', flat=True))
+                group = [payment for payment in group if payment.pk in won]
+            for payment in group:
+                payment.status = target
+                payment.updated_at = now
+                applied.append((payment, source))
+        statuses_changed(applied)
+    return applied
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.http import Http404
+from .models import Payment
+from .serializers import PaymentStatusSerializer
+from .signals import payment_status_changed
+
+STATUS_CACHE_KEY = 'payments:status:{}:{}'
+NOT_FOUND = 'not-found'
+
+
+def _key(user_id, transaction_id):
+    return STATUS_CACHE_KEY.format(user_id, transaction_id)
+
+
+def get_payment_status(user, transaction_id):
+    """
+    Read-through cache in front of PaymentStatusView. Final states are
+    cached for long since they never change again; open states only for a
+    few seconds, and every write to the payment drops the entry, so a poll
+    can never keep showing PROCESSING once the payment has settled. Unknown
+    IDs are negatively cached briefly.
+    """
+    key = _key(user.pk, transaction_id)
+    data = cache.get(key)
+    if data == NOT_FOUND:
+        raise Http404("No Payment matches the given query.")
+    if data is not None:
+        return data
+
+    payment = Payment.objects.filter(transaction_id=transaction_id, user=user).first() if transaction_id else None
+    if payment is None:
+        cache.set(key, NOT_FOUND, getattr(settings, 'PAYMENT_STATUS_CACHE_NEGATIVE_TTL', 2))
+        raise Http404("No Payment matches the given query.")
+
+    data = dict(PaymentStatusSerializer(payment).data)
+    if payment.status in Payment.FINAL_STATUSES:
+        timeout = getattr(settings, 'PAYMENT_STATUS_CACHE_FINAL_TTL', 3600)
+    else:
+        timeout = getattr(settings, 'PAYMENT_STATUS_CACHE_TTL', 3)
+    cache.set(key, data, timeout)
+    return data
+
+
+def invalidate_payment_status(payment):
+    
+    cache.delete(_key(payment.user_id, payment.transaction_id))
+
+
+@receiver(post_save, sender=Payment)
+def drop_status_on_save(sender, instance, **kwargs):
+    
+    invalidate_payment_status(instance)
+
+
+@receiver(payment_status_changed)
+def drop_status_on_change(sender, payment, **kwargs):
+    
+    invalidate_payment_status(payment)
@@ -0,0 +1,86 @@
+import json, time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from accounts.authentication import request_user
+from .models import Payment
+from .notifications import status_hub, status_message
+
+
+@sync_to_async
+def _load_payment(request, transaction_id):
+    
+    # EventSource cannot send headers, so browsers pass the token in the query string.
+    user = request_user(request, query_param='token')
+    if user is None:
+        return None, None
+    payment = Payment.objects.filter(transaction_id=transaction_id, user=user).only(
+        'transaction_id', 'status', 'updated_at'
+    ).first()
+    return user, payment
+
+
+def _sse(message, event='status'):
+    
+    return f"event: {event}\ndata: {json.dumps(message)}\n\n"
+
+
+async def _event_stream(subscription, payment):
+    
+    heartbeat = getattr(settings, 'PAYMENT_STATUS_STREAM_HEARTBEAT', 15)
+    deadline = time.monotonic() + getattr(settings, 'PAYMENT_STATUS_STREAM_MAX_AGE', 300)
+    last_status = payment.status
+
+    try:
+        yield "retry: 3000\n" + _sse(status_message(payment))
+        while last_status not in Payment.FINAL_STATUSES and time.monotonic() < deadline:
+            message = await status_hub.next_message(subscription, payment.transaction_id, last_status, heartbeat)
+            if message is None:
+                yield ": keep-alive\n\n"
+            elif message['status'] != last_status:
+                last_status = message['status']
+                yield _sse(message)
+    finally:
+        status_hub.unsubscribe(payment.transaction_id, subscription)
+
+
+@require_GET
+async def payment_status_stream(request):
+    """
+    Pushes a payment's status to the client until it reaches a final state.
+
+    Server-Sent Events by default; ``?mode=poll&since=<STATUS>`` turns it into
+    a long-poll that returns as soon as the status differs from ``since``.
+    Intended to be served through the ASGI application (core.asgi).
+    """
+    transaction_id = request.GET.get('transaction_id')
+    if not transaction_id:
+        return JsonResponse({"detail": "transaction_id is required."}, status=400)
+
+    # Subscribe before reading the row so a change committed in between is not lost.
+    subscription = status_hub.subscribe(transaction_id)
+    streaming = False
+    try:
+        user, payment = await _load_payment(request, transaction_id)
+        if user is None:
+            return JsonResponse({"detail": "Invalid or missing token."}, status=401)
+        if payment is None:
+            return JsonResponse({"detail": "No Payment matches the given query."}, status=404)
+
+        if request.GET.get('mode') == 'poll':
+            since = (request.GET.get('since') or '').upper()
+            message = status_message(payment)
+            if payment.status == since and since not in Payment.FINAL_STATUSES:
+                timeout = getattr(settings, 'PAYMENT_STATUS_LONG_POLL_TIMEOUT', 25)
+                message = await status_hub.next_message(subscription, transaction_id, since, timeout) or message
+            return JsonResponse(message)
+
+        response = StreamingHttpResponse(_event_stream(subscription, payment), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        streaming = True
+        return response
+    finally:
+        if not streaming:
+            status_hub.unsubscribe(transaction_id, subscription)
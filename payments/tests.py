@@ -1,3 +1,369 @@
-from django.test import TestCase
+import json, uuid
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from accounts.models import User
+from .gateways import GatewayError, get_gateway
+from .gateways.base import CreateResult
+from .gateways.bkash import BkashGateway
+from .idempotency import _request_hash, idempotent_response
+from .inbox import enqueue_webhook, process_webhook_inbox
+from .models import IdempotencyKey, Payment, PaymentEvent, PaymentRollup, WebhookInbox
+from .reconciliation import Reconciler, stale_pending
+from .rollups import rebuild_rollups
+from .services import queue_dispatch
+from .state import APPLIED, NOOP, REJECTED, bulk_transition, can_transition, transition
 
-# Create your tests here.
+# Runs pool.map inline, so reconciler passes stay on the test's connection.
+INLINE_POOL = SimpleNamespace(map=lambda fn, items: [fn(item) for item in items])
+
+
+class PaymentTransitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='payer@example.com', password=None, username='payer')
+
+    def make_payment(self, status='PENDING'):
+        return Payment.objects.create(
+            user=self.user, payment_method='BKASH', amount=10, status=status, transaction_id=uuid.uuid4().hex,
+        )
+
+    def test_transition_table(self):
+        self.assertTrue(can_transition('PENDING', 'PROCESSING'))
+        self.assertTrue(can_transition('PROCESSING', 'SUCCESS'))
+        self.assertFalse(can_transition('SUCCESS', 'FAILED'))
+        self.assertFalse(can_transition('FAILED', 'SUCCESS'))
+
+    def test_noop_transition_writes_nothing(self):
+        payment = self.make_payment('PROCESSING')
+        updated_at = Payment.objects.get(pk=payment.pk).updated_at
+
+        with self.assertNumQueries(0):
+            self.assertEqual(transition(payment, 'PROCESSING'), NOOP)
+        self.assertEqual(Payment.objects.get(pk=payment.pk).updated_at, updated_at)
+
+    def test_late_failed_is_rejected_after_success(self):
+        payment = self.make_payment('PROCESSING')
+        self.assertEqual(transition(payment, 'SUCCESS'), APPLIED)
+
+        # A stale copy still believes the payment is PROCESSING.
+        stale = Payment.objects.get(pk=payment.pk)
+        stale.status = 'PROCESSING'
+        self.assertEqual(transition(stale, 'FAILED'), REJECTED)
+        self.assertEqual(bulk_transition([(stale, 'FAILED')]), [])
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'SUCCESS')
+
+    def test_bulk_transition_skips_rows_moved_concurrently(self):
+        first, second, third = (self.make_payment('PROCESSING') for _ in range(3))
+        # Another worker settles the second payment after we read it.
+        Payment.objects.filter(pk=second.pk).update(status='FAILED')
+
+        applied = bulk_transition([(first, 'SUCCESS'), (second, 'SUCCESS'), (third, 'SUCCESS')])
+
+        self.assertEqual({payment.pk for payment, _ in applied}, {first.pk, third.pk})
+        self.assertTrue(all(previous == 'PROCESSING' for _, previous in applied))
+        self.assertEqual(
+            dict(Payment.objects.filter(pk__in=[first.pk, second.pk, third.pk]).values_list('pk', 'status')),
+            {first.pk: 'SUCCESS', second.pk: 'FAILED', third.pk: 'SUCCESS'},
+        )
+        # The in-memory copy of the row that lost keeps the status it was read with.
+        self.assertEqual(second.status, 'PROCESSING')
+
+
+class PaymentDispatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='dispatch@example.com', password=None, username='dispatch')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_payment(self):
+        return Payment.objects.create(user=self.user, payment_method='BKASH', amount=10, transaction_id=uuid.uuid4().hex)
+
+    def test_sync_create_not_accepted_fails_and_is_never_redispatched(self):
+        rejected = CreateResult({}, {"error": "Invalid response from bKash sandbox."}, 200, accepted=False)
+        with mock.patch.object(BkashGateway, 'create', return_value=rejected) as create:
+            response = self.client.post('/api/payments/create/', {'payment_method': 'BKASH', 'amount': '10'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        payment = Payment.objects.get(transaction_id=response.json()['transaction_id'])
+        self.assertEqual(payment.status, 'FAILED')
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(stale_pending(timedelta(0), 10), [])
+
+    def test_sync_create_unexpected_error_fails_the_payment(self):
+        self.client.raise_request_exception = False
+        with mock.patch.object(BkashGateway, 'create', side_effect=ValueError('boom')):
+            response = self.client.post('/api/payments/create/', {'payment_method': 'BKASH', 'amount': '10'}, format='json')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(Payment.objects.get(user=self.user).status, 'FAILED')
+
+    def test_only_queued_pending_payments_are_redispatched(self):
+        synchronous = self.make_payment()
+        queued = self.make_payment()
+        queue_dispatch(queued)
+
+        self.assertEqual([payment.pk for payment in stale_pending(timedelta(0), 10)], [queued.pk])
+        self.assertTrue(PaymentEvent.objects.filter(payment=queued, kind='DISPATCH').exists())
+        self.assertFalse(PaymentEvent.objects.filter(payment=synchronous).exists())
+
+    def test_redispatch_respects_limit(self):
+        for _ in range(3):
+            queue_dispatch(self.make_payment())
+        reconciler = Reconciler()
+        reconciler.dispatch_after = timedelta(0)
+        stats = {"redispatched": 0, "expired": 0}
+
+        with mock.patch('payments.reconciliation.dispatch_payment') as dispatch, \
+                mock.patch('payments.reconciliation.close_old_connections'):
+            handled = reconciler.redispatch_pending(INLINE_POOL, stats, limit=2)
+
+        self.assertEqual(handled, 2)
+        self.assertEqual(dispatch.call_count, 2)
+        self.assertEqual(stats['redispatched'], 2)
+
+
+@override_settings(PAYMENT_WEBHOOK_AUTO_DRAIN=False)
+class WebhookInboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='hooks@example.com', password=None, username='hooks')
+
+    def make_payment(self, gateway_reference=None):
+        return Payment.objects.create(
+            user=self.user, payment_method='BKASH', amount=10, status='PROCESSING',
+            transaction_id=uuid.uuid4().hex, gateway_reference=gateway_reference or uuid.uuid4().hex,
+        )
+
+    def deliver(self, **payload):
+        enqueue_webhook(json.dumps(payload).encode())
+
+    def test_first_final_status_wins_across_identifiers(self):
+        payment = self.make_payment()
+        self.deliver(transaction_id=payment.transaction_id, status='SUCCESS')
+        self.deliver(paymentID=payment.gateway_reference, status='FAILED')
+
+        result = process_webhook_inbox()
+
+        self.assertEqual((result['fetched'], result['applied']), (2, 1))
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'SUCCESS')
+        self.assertEqual(PaymentEvent.objects.filter(payment=payment, kind='WEBHOOK').count(), 2)
+
+    def test_batch_applies_each_payment_once(self):
+        first, second = self.make_payment(), self.make_payment()
+        self.deliver(paymentID=first.gateway_reference, status='SUCCESS')
+        self.deliver(paymentID=second.gateway_reference, status='FAILED')
+        self.deliver(paymentID=first.gateway_reference, status='SUCCESS', retry=1)
+        self.deliver(foo=1)
+
+        result = process_webhook_inbox()
+
+        self.assertEqual(result, {"fetched": 4, "applied": 2, "failed": 1, "deferred": 0})
+        self.assertEqual(
+            dict(Payment.objects.filter(pk__in=[first.pk, second.pk]).values_list('pk', 'status')),
+            {first.pk: 'SUCCESS', second.pk: 'FAILED'},
+        )
+        self.assertFalse(WebhookInbox.objects.filter(processed_at__isnull=True).exists())
+
+    def test_duplicate_deliveries_are_stored_once(self):
+        payment = self.make_payment()
+        self.deliver(paymentID=payment.gateway_reference, status='SUCCESS')
+        self.deliver(paymentID=payment.gateway_reference, status='SUCCESS')
+
+        self.assertEqual(WebhookInbox.objects.count(), 1)
+
+    def test_unmatched_delivery_is_deferred_until_its_payment_exists(self):
+        reference = uuid.uuid4().hex
+        self.deliver(paymentID=reference, status='SUCCESS')
+
+        self.assertEqual(process_webhook_inbox()['deferred'], 1)
+        row = WebhookInbox.objects.get()
+        self.assertIsNone(row.processed_at)
+        self.assertEqual(row.attempts, 1)
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        # Not due yet.
+        self.assertEqual(process_webhook_inbox()['fetched'], 0)
+
+        payment = self.make_payment(gateway_reference=reference)
+        WebhookInbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_webhook_inbox()['applied'], 1)
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'SUCCESS')
+
+    @override_settings(PAYMENT_WEBHOOK_UNMATCHED_MAX_AGE=0)
+    def test_unmatched_delivery_is_closed_once_too_old(self):
+        self.deliver(paymentID=uuid.uuid4().hex, status='SUCCESS')
+
+        self.assertEqual(process_webhook_inbox()['failed'], 1)
+        self.assertEqual(WebhookInbox.objects.get().error, "Payment not found.")
+
+
+class GatewayAdapterTests(TestCase):
+
+    def test_unsupported_operations_raise_gateway_error(self):
+        nagad = get_gateway('NAGAD')
+        with self.assertRaises(GatewayError):
+            nagad.refund(None)
+        with self.assertRaises(GatewayError):
+            async_to_sync(nagad.arefund)(None)
+
+    def test_every_adapter_has_sync_and_async_operations(self):
+        for method, _ in Payment.METHOD_CHOICES:
+            gateway = get_gateway(method)
+            for name in ('create', 'status', 'refund'):
+                self.assertIn(name, vars(type(gateway)), f"{method}.{name}")
+                self.assertIn('a' + name, vars(type(gateway)), f"{method}.a{name}")
+
+
+class PaymentRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='rollups@example.com', password=None, username='rollups')
+
+    def make_payment(self, amount=10, status='PENDING'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(
+                user=self.user, payment_method='BKASH', amount=amount, status=status, transaction_id=uuid.uuid4().hex,
+            )
+
+    def buckets(self):
+        return sorted(PaymentRollup.objects.exclude(count=0).values_list('status', 'count', 'total_amount'))
+
+    def test_new_payments_are_counted(self):
+        self.make_payment(10)
+        self.make_payment(5)
+
+        self.assertEqual(self.buckets(), [('PENDING', 2, 15)])
+
+    def test_transitions_move_the_payment_between_buckets(self):
+        payment = self.make_payment(10, status='PROCESSING')
+        self.make_payment(5, status='PROCESSING')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(payment, 'SUCCESS')
+
+        self.assertEqual(self.buckets(), [('PROCESSING', 1, 5), ('SUCCESS', 1, 10)])
+
+    def test_create_and_transitions_in_one_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = Payment.objects.create(
+                user=self.user, payment_method='BKASH', amount=7, status='PENDING', transaction_id=uuid.uuid4().hex,
+            )
+            transition(payment, 'PROCESSING')
+            transition(payment, 'SUCCESS')
+
+        self.assertEqual(self.buckets(), [('SUCCESS', 1, 7)])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        payment = self.make_payment(10, status='PROCESSING')
+        self.make_payment(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_transition([(payment, 'FAILED')])
+        incremental = self.buckets()
+
+        rebuild_rollups()
+
+        self.assertEqual(self.buckets(), incremental)
+
+    def test_admin_cannot_change_status(self):
+        admin_user = User.objects.create_superuser(email='admin@example.com', password='pw', username='admin')
+        payment = self.make_payment(10, status='PROCESSING')
+        self.client.force_login(admin_user)
+
+        response = self.client.post(f'/admin/payments/payment/{payment.pk}/change/', {
+            'user': self.user.pk, 'transaction_id': payment.transaction_id, 'status': 'SUCCESS',
+            'metadata': '{}', 'gateway_reference': '',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'PROCESSING')
+        self.assertEqual(self.buckets(), [('PROCESSING', 1, 10)])
+
+
+class IdempotencyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='idem@example.com', password=None, username='idem')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, key, amount='10'):
+        return self.client.post(
+            '/api/payments/create/', {'payment_method': 'BKASH', 'amount': amount}, format='json',
+            headers={'Idempotency-Key': key},
+        )
+
+    def fake_request(self, body):
+        return SimpleNamespace(data=body, method='POST', path='/api/payments/create/', user=self.user)
+
+    def test_replay_returns_the_stored_response_without_a_second_gateway_call(self):
+        accepted = CreateResult({}, {"paymentID": "P1"}, 200, reference='P1')
+        with mock.patch.object(BkashGateway, 'create', return_value=accepted) as create:
+            first = self.create('key-1')
+            second = self.create('key-1')
+
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Payment.objects.filter(user=self.user).count(), 1)
+
+    def test_same_key_with_a_different_body_is_rejected(self):
+        accepted = CreateResult({}, {"paymentID": "P2"}, 200, reference='P2')
+        with mock.patch.object(BkashGateway, 'create', return_value=accepted):
+            self.create('key-2')
+            response = self.create('key-2', amount='11')
+
+        self.assertEqual(response.status_code, 422)
+
+    def test_server_errors_are_not_stored(self):
+        response = idempotent_response(self.fake_request({'a': 1}), 'key-3', lambda: Response({}, status=502))
+
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(PAYMENT_IDEMPOTENCY_WAIT=0)
+    def test_in_flight_duplicate_gets_409(self):
+        IdempotencyKey.objects.create(
+            user=self.user, key='key-4', request_hash=_request_hash(self.fake_request({'a': 1})),
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+        response = idempotent_response(self.fake_request({'a': 1}), 'key-4', lambda: Response({}, status=201))
+
+        self.assertEqual(response.status_code, 409)
+
+    @override_settings(PAYMENT_IDEMPOTENCY_WAIT=0.3)
+    def test_vanishing_record_waits_with_backoff_until_the_deadline(self):
+        with mock.patch('payments.idempotency._claim', return_value=None) as claim, \
+                mock.patch('payments.idempotency.time.sleep') as sleep:
+            with mock.patch('payments.idempotency.time.monotonic', side_effect=[0, 0.1, 0.2, 0.4]):
+                response = idempotent_response(self.fake_request({'a': 1}), 'key-5', lambda: Response({}, status=201))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(claim.call_count, 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.05, 0.1])
+
+    def test_record_taken_over_while_the_handler_runs_still_answers(self):
+        def handler():
+            # Another request judged it abandoned and removed it.
+            IdempotencyKey.objects.all().delete()
+            return Response({"ok": True}, status=201)
+
+        response = idempotent_response(self.fake_request({'a': 1}), 'key-6', handler)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(IdempotencyKey.objects.exists())
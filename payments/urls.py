@@ -1,12 +1,28 @@
 from django.urls import path
-from .views import PaymentCreateView, PaymentWebhookView, PaymentStatusView
+from .async_views import payment_create_async
+from .streams import payment_status_stream
+from .views import PaymentCreateView, PaymentEventListView, PaymentListView, PaymentWebhookView, PaymentStatusView, PaymentStatsView, PaymentExportView, PaymentMetricsView
 
 urlpatterns = [
 
+    path('', PaymentListView.as_view(), name='payment-list'),
+
     path('create/', PaymentCreateView.as_view(), name='payment-create'),
 
+    path('create/async/', payment_create_async, name='payment-create-async'),
+
     path('webhook/', PaymentWebhookView.as_view(), name='payment-webhook'),
     
     path('status/', PaymentStatusView.as_view(), name='payment-status'),
+
+    path('events/', PaymentEventListView.as_view(), name='payment-events'),
+
+    path('stream/', payment_status_stream, name='payment-status-stream'),
+
+    path('stats/', PaymentStatsView.as_view(), name='payment-stats'),
+
+    path('export/', PaymentExportView.as_view(), name='payment-export'),
+
+    path('metrics/', PaymentMetricsView.as_view(), name='payment-metrics'),
 ]
 
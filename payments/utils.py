@@ -1,8 +1,13 @@
-import os, hmac, hashlib, requests, base64
+import asyncio, contextlib, contextvars, os, hmac, hashlib, httpx, requests, threading, time, weakref
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.core.cache import cache
 
 DEFAULT_TIMEOUT = 15  
 
+BKASH_TOKEN_CACHE_KEY = 'payments:bkash:token'
+BKASH_TOKEN_LOCK_KEY = 'payments:bkash:token:lock'
+
 def verify_signature(raw_body: bytes, signature_from_header: str) -> bool:
     
     secret = getattr(settings, 'PAYMENT_WEBHOOK_SECRET', None)
@@ -15,62 +20,268 @@ def verify_signature(raw_body: bytes, signature_from_header: str) -> bool:
     computed = hmac.new(secret.encode(), raw_body, hashlib.sha256).hexdigest()
     return hmac.compare_digest(computed, signature_from_header or '')
 
-def get_bkash_token():
-    
-    url = f"{settings.BKASH_BASE_URL}/tokenized/checkout/token/grant"
-    payload = {
-        "app_key": settings.BKASH_APP_KEY,
-        "app_secret": settings.BKASH_APP_SECRET
-    }
-    
-    headers = {
-        "Content-Type": "application/json",
-        "username": settings.BKASH_USERNAME,
-        "password": settings.BKASH_PASSWORD,
-    }
-    
-    try:
-        res = requests.post(url, json=payload, headers=headers, timeout=DEFAULT_TIMEOUT)
-        print("🔹 BKASH TOKEN RESPONSE:", res.text)
-        data = res.json() if res.headers.get("Content-Type","").startswith("application/json") else {}
+class GatewayClient:
+    """
+    Shared, per-process HTTP client for every payment gateway call.
+
+    A single requests.Session keeps one urllib3 connection pool per host, so
+    TCP+TLS connections to the bKash / Nagad hosts are reused (keep-alive)
+    instead of being re-established for every call. The session is rebuilt
+    after a fork so worker processes never share sockets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    def session(self):
         
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._build_session()
+                    self._pid = os.getpid()
+        return self._session
+
+    def _build_session(self):
         
-        if res.status_code == 200 and data.get('id_token'):
-            return data.get("id_token")
-    except Exception as e:
-        print("⚠️ bKash Token Error:", e)
-    return None
+        adapter = HTTPAdapter(
+            pool_connections=getattr(settings, 'PAYMENT_HTTP_POOL_CONNECTIONS', 10),
+            pool_maxsize=getattr(settings, 'PAYMENT_HTTP_POOL_MAXSIZE', 50),
+            max_retries=0,
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
 
-def nagad_initiate_payment(amount, invoice_id):
-    
-    
-    base_url = getattr(settings, 'NAGAD_BASE_URL', 'https://sandbox.mynagad.com')
-    merchant_id = getattr(settings, 'NAGAD_MERCHANT_ID', getattr(settings, 'NAGAD_APP_MERCHANTID', '6800000025'))
-    callback_url = f"{settings.SITE_URL}/api/payments/webhook/"
-
-    payload = {
-        "merchantId": merchant_id,
-        "orderId": invoice_id,
-        "currencyCode": "050",
-        "amount": str(amount),
-        "challenge": base64.b64encode(os.urandom(16)).decode(),
-        "callbackUrl": callback_url,
-        "productDetails": "Demo purchase"
-    }
-
-    headers = {"Content-Type": "application/json"}
-    
-    try:
-        res = requests.post(
-            f"{base_url}/remote-payment-gateway-1.0/api/dfs/check-out/initialize",
-            json=payload,
-            headers=headers,
-            timeout=DEFAULT_TIMEOUT
+    def timeout(self, gateway):
+        
+        timeouts = getattr(settings, 'PAYMENT_GATEWAY_TIMEOUTS', {})
+        return timeouts.get(gateway, (3.05, DEFAULT_TIMEOUT))
+
+    def request(self, gateway, method, url, **kwargs):
+        
+        kwargs.setdefault('timeout', self.timeout(gateway))
+        return self.session().request(method, url, **kwargs)
+
+    def post(self, gateway, url, **kwargs):
+        return self.request(gateway, 'POST', url, **kwargs)
+
+    def get(self, gateway, url, **kwargs):
+        return self.request(gateway, 'GET', url, **kwargs)
+
+    def close(self):
+        
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+
+gateway_client = GatewayClient()
+
+
+class AsyncGatewayClient:
+    """
+    asyncio counterpart of GatewayClient built on httpx. One pooled
+    AsyncClient is kept per event loop, because httpx connections are bound
+    to the loop that opened them; an ASGI server runs one loop for its
+    lifetime, so the pool lives as long as the worker.
+
+    Code running on a short-lived loop (an async view served through WSGI
+    gets a fresh loop per request) wraps its calls in ``scoped()`` instead,
+    so the client and its connections are closed before the loop goes away.
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self._scoped = contextvars.ContextVar('async_gateway_client', default=None)
+
+    def _new_client(self):
+        
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=getattr(settings, 'PAYMENT_HTTP_POOL_MAXSIZE', 50),
+                max_keepalive_connections=getattr(settings, 'PAYMENT_HTTP_POOL_MAXSIZE', 50),
+            ),
         )
+
+    def client(self):
         
-        print("🔹 NAGAD RESPONSE:", res.text)
-        return res.json()
+        scoped = self._scoped.get()
+        if scoped is not None:
+            return scoped
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._new_client()
+            self._clients[loop] = client
+        return client
+
+    @contextlib.asynccontextmanager
+    async def scoped(self):
+        """Routes the calls made inside the block through a client closed on exit."""
+        async with self._new_client() as client:
+            token = self._scoped.set(client)
+            try:
+                yield client
+            finally:
+                self._scoped.reset(token)
+
+    async def request(self, gateway, method, url, **kwargs):
         
-    except Exception as e:
-        print("⚠️ Nagad Sandbox Error:", e)
-        return {"error": "Nagad sandbox not reachable"}
+        connect, read = gateway_client.timeout(gateway)
+        kwargs.setdefault('timeout', httpx.Timeout(read, connect=connect))
+        return await self.client().request(method, url, **kwargs)
+
+
+async_gateway_client = AsyncGatewayClient()
+
+
+class BkashTokenManager:
+    """
+    Caches the bKash id_token in the Django cache so every worker process
+    shares one token, and refreshes it shortly before it expires.
+
+    Only one caller refreshes at a time: a thread lock serialises refreshes
+    inside a process and a short-lived cache lock does the same across
+    processes, so a burst of checkouts results in a single grant call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = None
+        self.hits = 0
+        self.misses = 0
+        self.grants = 0
+        self.refreshes = 0
+        self.failures = 0
+
+    def _margin(self):
+        return getattr(settings, 'BKASH_TOKEN_REFRESH_MARGIN', 300)
+
+    def _is_fresh(self, entry):
+        return bool(entry) and entry['expires_at'] - self._margin() > time.time()
+
+    def get_token(self):
+        
+        entry = self._local if self._is_fresh(self._local) else cache.get(BKASH_TOKEN_CACHE_KEY)
+        if self._is_fresh(entry):
+            self.hits += 1
+            self._local = entry
+            return entry['id_token']
+
+        self.misses += 1
+        with self._lock:
+            entry = cache.get(BKASH_TOKEN_CACHE_KEY)
+            if not self._is_fresh(entry):
+                entry = self._refresh_shared(entry)
+            self._local = entry if self._is_fresh(entry) else None
+        return entry['id_token'] if entry else None
+
+    def invalidate(self):
+        
+        self._local = None
+        cache.delete(BKASH_TOKEN_CACHE_KEY)
+
+    def stats(self):
+        
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "grants": self.grants,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    def _refresh_shared(self, stale):
+        
+        lock_timeout = getattr(settings, 'BKASH_TOKEN_LOCK_TIMEOUT', DEFAULT_TIMEOUT + 5)
+        if not cache.add(BKASH_TOKEN_LOCK_KEY, os.getpid(), timeout=lock_timeout):
+            # Another process is refreshing; wait for its result instead of racing it.
+            deadline = time.time() + lock_timeout
+            while time.time() < deadline:
+                time.sleep(0.05)
+                entry = cache.get(BKASH_TOKEN_CACHE_KEY)
+                if self._is_fresh(entry):
+                    return entry
+                if cache.get(BKASH_TOKEN_LOCK_KEY) is None:
+                    break
+            if not cache.add(BKASH_TOKEN_LOCK_KEY, os.getpid(), timeout=lock_timeout):
+                return None
+
+        try:
+            data = None
+            if stale and stale.get('refresh_token') and stale['refresh_expires_at'] > time.time():
+                data = self._request_token('refresh', {"refresh_token": stale['refresh_token']})
+                if data:
+                    self.refreshes += 1
+            if not data:
+                stale = None
+                data = self._request_token('grant', {})
+                if data:
+                    self.grants += 1
+            if not data:
+                self.failures += 1
+                return None
+
+            now = time.time()
+            refresh_ttl = getattr(settings, 'BKASH_REFRESH_TOKEN_TTL', 28 * 24 * 3600)
+            entry = {
+                "id_token": data['id_token'],
+                "expires_at": now + int(data.get('expires_in') or 3600),
+                "refresh_token": None,
+                "refresh_expires_at": 0,
+            }
+            if data.get('refresh_token'):
+                entry['refresh_token'] = data['refresh_token']
+                entry['refresh_expires_at'] = now + refresh_ttl
+            elif stale:
+                entry['refresh_token'] = stale['refresh_token']
+                entry['refresh_expires_at'] = stale['refresh_expires_at']
+
+            cache_timeout = max(entry['refresh_expires_at'], entry['expires_at']) - now
+            cache.set(BKASH_TOKEN_CACHE_KEY, entry, timeout=int(cache_timeout))
+            return entry
+        finally:
+            cache.delete(BKASH_TOKEN_LOCK_KEY)
+
+    def _request_token(self, action, extra):
+        
+        url = f"{settings.BKASH_BASE_URL}/tokenized/checkout/token/{action}"
+        payload = {
+            "app_key": settings.BKASH_APP_KEY,
+            "app_secret": settings.BKASH_APP_SECRET,
+            **extra,
+        }
+        
+        headers = {
+            "Content-Type": "application/json",
+            "username": settings.BKASH_USERNAME,
+            "password": settings.BKASH_PASSWORD,
+        }
+        
+        try:
+            res = gateway_client.post('BKASH', url, json=payload, headers=headers)
+            print(f"🔹 BKASH TOKEN {action.upper()} RESPONSE:", res.status_code)
+            data = res.json() if res.headers.get("Content-Type","").startswith("application/json") else {}
+        except Exception as e:
+            print(f"⚠️ bKash Token {action} Error:", e)
+            return None
+
+        if res.status_code != 200 or not data.get('id_token'):
+            return None
+
+        return data
+
+
+bkash_token_manager = BkashTokenManager()
+
+
+def get_bkash_token():
+    
+    return bkash_token_manager.get_token()
@@ -1,96 +1,76 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
-from .models import Payment
-from .serializers import PaymentCreateSerializer, PaymentStatusSerializer
-from .utils import get_bkash_token, nagad_initiate_payment, verify_signature
+from .models import Payment, PaymentEvent, PaymentRollup
+from .pagination import PaymentCursorPagination, PaymentEventCursorPagination
+from .serializers import PaymentCreateSerializer, PaymentEventSerializer, PaymentListSerializer
+from .export import EXPORT_TYPES, aiter_export, export_rows, stream_export
+from .gateways import GatewayError, is_supported, parse_webhook
+from .services import initiate_payment, queue_dispatch
+from .idempotency import idempotent_response
+from .inbox import enqueue_webhook
+from .status_cache import get_payment_status
+from .utils import bkash_token_manager, verify_signature
 from django.conf import settings
-import requests, uuid, json
-
-DEFAULT_TIMEOUT = 20  
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.db.models import Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from datetime import datetime, timedelta
+import json
 
 class PaymentCreateView(generics.CreateAPIView):
     
     serializer_class = PaymentCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def wants_async(self, request):
+        
+        prefer = request.headers.get('Prefer', '')
+        return getattr(settings, 'PAYMENT_ASYNC_DISPATCH', False) or 'respond-async' in prefer
+
     def create(self, request, *args, **kwargs):
         
+        key = request.headers.get('Idempotency-Key')
+        if key:
+            return idempotent_response(request, key, lambda: self.create_payment(request))
+        return self.create_payment(request)
+
+    def create_payment(self, request):
+        
         serializer = self.get_serializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         payment = serializer.save()
 
-        
-        if payment.payment_method == 'BKASH':
-            
-            token = get_bkash_token()
-            if not token:
-                return Response(
-                    {"detail": "Unable to obtain bKash sandbox token. Check BKASH_* credentials."},
-                    status=status.HTTP_502_BAD_GATEWAY
-                )
+        if not is_supported(payment.payment_method):
+            return Response({"error": "Unsupported payment method."}, status=status.HTTP_400_BAD_REQUEST)
 
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "X-APP-Key": settings.BKASH_APP_KEY,
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                
-                "mode": "0011",
-                "payerReference": str(request.user.id),
-                "callbackURL": f"{settings.SITE_URL}/api/payments/webhook/",
-                "amount": str(payment.amount),
-                "currency": "BDT",
-                "intent": "sale",
-                "merchantInvoiceNumber": str(uuid.uuid4())[:10],
-            }
-
-            url = f"{settings.BKASH_BASE_URL}/tokenized/checkout/create"
-            
-            try:
-                res = requests.post(url, json=payload, headers=headers, timeout=DEFAULT_TIMEOUT)
-                
-            except Exception as e:
-                return Response(
-                    {"detail": f"bKash create error: {e}"},
-                    status=status.HTTP_502_BAD_GATEWAY
-                )
-
-            try:
-                data = res.json()
-                # Typical success fields: paymentID, bkashURL
-                payment.gateway_reference = data.get("paymentID") or payment.gateway_reference
-                payment.status = 'PROCESSING'
-                payment.save(update_fields=["gateway_reference", "status"])
-                
-            except Exception:
-                data = {"error": "Invalid response from bKash sandbox."}
-
-           
-            out = {
-                "transaction_id": payment.transaction_id,
-                "status": payment.status,
-                "gateway_response": data
-            }
-            
-            return Response(out, status=res.status_code)
-
-       
-        elif payment.payment_method == 'NAGAD':
-            
-            resp = nagad_initiate_payment(payment.amount, str(uuid.uuid4())[:10])
-            payment.status = 'PROCESSING'
-            payment.save(update_fields=["status"])
+        
+        if self.wants_async(request):
             
+            queue_dispatch(payment)
             return Response(
-                {"transaction_id": payment.transaction_id, "status": payment.status, "gateway_response": resp},
-                status=status.HTTP_201_CREATED
+                {
+                    "transaction_id": payment.transaction_id,
+                    "status": payment.status,
+                    "status_url": f"{reverse('payment-status')}?transaction_id={payment.transaction_id}",
+                },
+                status=status.HTTP_202_ACCEPTED
             )
 
-        return Response({"error": "Unsupported payment method."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            data, http_status = initiate_payment(payment)
+        except GatewayError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+
+        return Response(
+            {"transaction_id": payment.transaction_id, "status": payment.status, "gateway_response": data},
+            status=http_status
+        )
 
 
 class PaymentWebhookView(APIView):
@@ -113,27 +93,14 @@ class PaymentWebhookView(APIView):
         except Exception:
             return Response({"detail": "Invalid JSON."}, status=status.HTTP_400_BAD_REQUEST)
 
-        
-        txid = payload.get('transaction_id')
-        gateway_ref = payload.get('paymentID') or payload.get('gateway_reference')
-        new_status = (payload.get('status') or '').upper()
-
-        payment = None
-        
-        if txid:
-            payment = get_object_or_404(Payment, transaction_id=txid)
-        elif gateway_ref:
-            payment = get_object_or_404(Payment, gateway_reference=gateway_ref)
-        else:
+        if not isinstance(payload, dict) or parse_webhook(payload) is None:
             return Response({"detail": "Missing transaction identifiers."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if new_status in ['SUCCESS', 'FAILED', 'CANCELED']:
-            
-            payment.status = new_status
-            payment.metadata['webhook_payload'] = payload
-            payment.save(update_fields=['status', 'metadata'])
+        
+        # Acknowledge right away; the inbox processor applies the status change in batches.
+        enqueue_webhook(raw)
 
-        return Response({"status": payment.status, "transaction_id": payment.transaction_id}, status=status.HTTP_200_OK)
+        return Response({"detail": "Webhook received."}, status=status.HTTP_200_OK)
 
 
 class PaymentStatusView(APIView):
@@ -143,5 +110,148 @@ class PaymentStatusView(APIView):
     def get(self, request):
         
         txid = request.query_params.get('transaction_id')
-        payment = get_object_or_404(Payment, transaction_id=txid, user=request.user)
-        return Response(PaymentStatusSerializer(payment).data, status=status.HTTP_200_OK)
+        data = get_payment_status(request.user, txid)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+
+class PaymentListView(generics.ListAPIView):
+    
+    serializer_class = PaymentListSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PaymentCursorPagination
+
+    def parse_bound(self, name):
+        
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_datetime(value) or parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: "Use an ISO 8601 date or datetime."})
+        if not isinstance(parsed, datetime):
+            parsed = datetime.combine(parsed, datetime.min.time())
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+    def get_queryset(self):
+        
+        params = self.request.query_params
+        queryset = Payment.objects.filter(user=self.request.user).only(
+            'id', 'user_id', 'transaction_id', 'payment_method', 'amount', 'currency', 'status', 'created_at'
+        )
+
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'].upper())
+        if params.get('method'):
+            queryset = queryset.filter(payment_method=params['method'].upper())
+
+        created_after = self.parse_bound('created_after')
+        created_before = self.parse_bound('created_before')
+        if created_after:
+            queryset = queryset.filter(created_at__gte=created_after)
+        if created_before:
+            queryset = queryset.filter(created_at__lt=created_before)
+
+        return queryset
+
+
+class PaymentEventListView(generics.ListAPIView):
+    
+    serializer_class = PaymentEventSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PaymentEventCursorPagination
+
+    def get_queryset(self):
+        
+        txid = self.request.query_params.get('transaction_id')
+        payment = get_object_or_404(Payment.objects.only('id'), transaction_id=txid, user=self.request.user)
+        queryset = PaymentEvent.objects.filter(payment=payment)
+
+        kind = self.request.query_params.get('kind')
+        if kind:
+            queryset = queryset.filter(kind=kind.upper())
+        return queryset
+
+
+class PaymentStatsView(APIView):
+    
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        
+        params = request.query_params
+        until = parse_date(params['until']) if params.get('until') else None
+        since = parse_date(params['since']) if params.get('since') else None
+        if (params.get('until') and until is None) or (params.get('since') and since is None):
+            raise ValidationError({"detail": "since / until must be YYYY-MM-DD dates."})
+        until = until or timezone.localdate()
+        since = since or until - timedelta(days=29)
+
+        rollups = PaymentRollup.objects.filter(day__gte=since, day__lte=until)
+        if params.get('currency'):
+            rollups = rollups.filter(currency=params['currency'].upper())
+
+        def grouped(*fields):
+            return [
+                {**row, "total_amount": str(row['total_amount'])}
+                for row in rollups.order_by(*fields).values(*fields).annotate(
+                    count=Sum('count'), total_amount=Sum('total_amount')
+                )
+            ]
+
+        return Response({
+            "since": since,
+            "until": until,
+            "totals": grouped('currency'),
+            "by_method": grouped('payment_method', 'currency'),
+            "by_status": grouped('status', 'currency'),
+            "by_day": grouped('day', 'payment_method', 'status', 'currency'),
+        }, status=status.HTTP_200_OK)
+
+
+class PaymentExportView(APIView):
+    
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        
+        params = request.query_params
+        export_type = params.get('type', 'csv').lower()
+        if export_type not in EXPORT_TYPES:
+            raise ValidationError({"type": f"Choose one of: {', '.join(EXPORT_TYPES)}."})
+        gzip = params.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+        try:
+            rows = export_rows(
+                since=params.get('since'),
+                until=params.get('until'),
+                status=params.get('status'),
+                method=params.get('method'),
+            )
+        except ValueError as e:
+            raise ValidationError({"detail": str(e)})
+
+        filename = f"payments.{export_type}" + (".gz" if gzip else "")
+        chunks = stream_export(rows, export_type, gzip=gzip)
+        if isinstance(request._request, ASGIRequest):
+            chunks = aiter_export(chunks)
+        response = StreamingHttpResponse(
+            chunks,
+            content_type='application/gzip' if gzip else EXPORT_TYPES[export_type],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class PaymentMetricsView(APIView):
+    
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        
+        return Response({
+            "bkash_token": bkash_token_manager.stats(),
+        }, status=status.HTTP_200_OK)